@@ -0,0 +1,82 @@
+# benchmark_face_preprocessing.py
+# Compara o encoding das fotos de fotos_referencia/ (e da foto de batida de teste) no caminho antigo
+# (cv2.imread em resolução cheia) e com a preparação de face_preprocessing.py: tempo por foto e se as
+# decisões de "mesma pessoa" continuam as mesmas.
+#
+# Uso:
+#   python benchmark_face_preprocessing.py [repeticoes] [foto_de_batida MATRICULA_ESPERADA]
+#   ex: python benchmark_face_preprocessing.py 3 fotos_batidas/teste.jpg 0601000343
+# A redução é opcional; para medir um lado máximo, defina FACE_PREPROCESS_MAX_SIDE:
+#   ex: FACE_PREPROCESS_MAX_SIDE=800 python benchmark_face_preprocessing.py 3
+import glob
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+import face_preprocessing
+from face_store import DEFAULT_TOLERANCES
+
+TOLERANCIA = DEFAULT_TOLERANCES["euclidean"]
+
+def encoding_antigo(foto_bytes):
+    imagem_bgr = cv2.imdecode(np.frombuffer(foto_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    encodings = face_recognition.face_encodings(cv2.cvtColor(imagem_bgr, cv2.COLOR_BGR2RGB))
+    return encodings[0] if encodings else None
+
+def encoding_novo(foto_bytes):
+    face_preprocessing.face_crop_cache.invalidate()
+    return face_preprocessing.encode_face(face_recognition, foto_bytes)[0]
+
+def encoding_novo_com_cache(foto_bytes):
+    return face_preprocessing.encode_face(face_recognition, foto_bytes)[0]
+
+def medir(funcao, foto_bytes, repeticoes):
+    tempos, encoding = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        encoding = funcao(foto_bytes)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return encoding, statistics.median(tempos)
+
+def decisoes(encodings):
+    nomes = [nome for nome in encodings if encodings[nome] is not None]
+    return {(a, b): bool(np.linalg.norm(encodings[a] - encodings[b]) <= TOLERANCIA) for a in nomes for b in nomes if a < b}
+
+if __name__ == "__main__":
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    fotos = {os.path.splitext(os.path.basename(path))[0]: path for path in sorted(glob.glob(os.path.join("fotos_referencia", "*.jpg")))}
+    esperado = None
+    if len(sys.argv) > 3:
+        fotos["batida"] = sys.argv[2]
+        esperado = sys.argv[3]
+    face_recognition.face_encodings(np.zeros((64, 64, 3), dtype=np.uint8)) # aquecimento do dlib
+
+    print(f"Lado máximo da preparação: {face_preprocessing.get_settings('face_recognition')['max_side'] or 'sem redução'}")
+    antigos, novos = {}, {}
+    total_antigo = total_novo = total_cache = 0.0
+    print(f"{'foto':<12} {'pixels':>10} {'antes (ms)':>11} {'depois (ms)':>12} {'c/ cache (ms)':>14} {'dist. antes x depois':>21}")
+    for nome, path in fotos.items():
+        with open(path, "rb") as foto:
+            foto_bytes = foto.read()
+        altura, largura = cv2.imdecode(np.frombuffer(foto_bytes, dtype=np.uint8), cv2.IMREAD_COLOR).shape[:2]
+        antigos[nome], tempo_antigo = medir(encoding_antigo, foto_bytes, repeticoes)
+        novos[nome], tempo_novo = medir(encoding_novo, foto_bytes, repeticoes)
+        _, tempo_cache = medir(encoding_novo_com_cache, foto_bytes, repeticoes)
+        total_antigo, total_novo, total_cache = total_antigo + tempo_antigo, total_novo + tempo_novo, total_cache + tempo_cache
+        distancia = "-" if antigos[nome] is None or novos[nome] is None else f"{np.linalg.norm(antigos[nome] - novos[nome]):.4f}"
+        print(f"{nome:<12} {altura * largura:>10} {tempo_antigo:>11.0f} {tempo_novo:>12.0f} {tempo_cache:>14.0f} {distancia:>21}")
+    print(f"{'total':<12} {'':>10} {total_antigo:>11.0f} {total_novo:>12.0f} {total_cache:>14.0f}")
+
+    sem_rosto = [nome for nome in fotos if (antigos[nome] is None) != (novos[nome] is None)]
+    mudancas = [par for par, decisao in decisoes(antigos).items() if decisoes(novos).get(par) != decisao]
+    print(f"\nFotos em que a detecção mudou: {sem_rosto or 'nenhuma'}")
+    print(f"Pares cuja decisão (mesma pessoa, tolerância {TOLERANCIA}) mudou: {mudancas or 'nenhum'}")
+    if esperado and novos.get("batida") is not None and novos.get(esperado) is not None:
+        for rotulo, encodings in (("antes", antigos), ("depois", novos)):
+            distancia = np.linalg.norm(encodings["batida"] - encodings[esperado])
+            print(f"Batida x {esperado} ({rotulo}): distância {distancia:.4f} -> {'mesma pessoa' if distancia <= TOLERANCIA else 'pessoa diferente'}")
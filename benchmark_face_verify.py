@@ -0,0 +1,37 @@
+# benchmark_face_verify.py
+# Mede o tempo de verificação facial por batida (p50/p99) com o modelo já carregado, como em /punches/face.
+# A carga do modelo é medida à parte e não entra nas amostras.
+#
+# Uso:
+#   python benchmark_face_verify.py MATRICULA FOTO [repeticoes]
+#   ex: python benchmark_face_verify.py 0601000343 fotos_batidas/teste.jpg 50
+import sys
+import time
+
+import numpy as np
+
+from face_store import FaceEmbeddingStore
+from face_verification import FaceVerifier
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python benchmark_face_verify.py MATRICULA FOTO [REPETICOES]")
+        sys.exit(1)
+    matricula, foto_path = sys.argv[1], sys.argv[2]
+    repeticoes = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    with open(foto_path, "rb") as foto:
+        foto_bytes = foto.read()
+
+    verifier = FaceVerifier(FaceEmbeddingStore())
+    print(f"Carga do modelo (uma vez por worker): {verifier.load():.2f} s")
+
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = verifier.verify(matricula, foto_bytes)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    print(f"Verificação ({repeticoes} repetições): p50 {np.percentile(tempos, 50):.1f} ms, "
+          f"p99 {np.percentile(tempos, 99):.1f} ms, máx {max(tempos):.1f} ms")
+    print(f"Resultado: {'mesma pessoa' if resultado['verified'] else 'pessoa diferente'} "
+          f"(distância {resultado['distance']:.4f}, tolerância {resultado['tolerance']})")
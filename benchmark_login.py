@@ -0,0 +1,57 @@
+# benchmark_login.py
+# Mede a vazão de logins (POST /token) sob uma rajada concorrente, como na troca de turno, e a latência
+# de uma requisição leve feita durante a rajada, para mostrar se o worker continua respondendo.
+#
+# Uso:
+#   uvicorn main:app --port 8000
+#   python benchmark_login.py http://localhost:8000 usuario senha [quantidade_de_logins] [concorrencia]
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def login(base_url, usuario, senha):
+    body = urllib.parse.urlencode({"username": usuario, "password": senha}).encode()
+    request = urllib.request.Request(f"{base_url}/token", data=body, headers={"Content-Type": "application/x-www-form-urlencoded"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())["access_token"]
+
+def medir_requisicao_leve(base_url, token, parar, latencias):
+    request = urllib.request.Request(f"{base_url}/cache/auth", headers={"Authorization": f"Bearer {token}"})
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(0.05)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Uso: python benchmark_login.py URL USUARIO SENHA [QUANTIDADE] [CONCORRENCIA]")
+        sys.exit(1)
+    base_url, usuario, senha = sys.argv[1].rstrip("/"), sys.argv[2], sys.argv[3]
+    quantidade = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+    concorrencia = int(sys.argv[5]) if len(sys.argv) > 5 else 20
+    token = login(base_url, usuario, senha)
+
+    parar = threading.Event()
+    latencias = []
+    monitor = threading.Thread(target=medir_requisicao_leve, args=(base_url, token, parar, latencias))
+    monitor.start()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        list(pool.map(lambda _: login(base_url, usuario, senha), range(quantidade)))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    monitor.join()
+
+    print(f"Logins: {quantidade} em {duracao:.2f} s ({quantidade / duracao:.1f} logins/s, concorrência {concorrencia})")
+    if latencias:
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        print(f"Requisição leve durante a rajada: {len(latencias)} amostras, "
+              f"mediana {statistics.median(latencias):.1f} ms, p99 {p99:.1f} ms, máx {latencias[-1]:.1f} ms")
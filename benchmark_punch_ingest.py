@@ -0,0 +1,59 @@
+# benchmark_punch_ingest.py
+# Mede a vazão de gravação de pontos externos: um POST /punches/external por registro
+# versus POST /punches/external/batch, contra um servidor local ligado a um PostgreSQL de testes.
+#
+# Uso:
+#   uvicorn main:app --port 8000   (com o banco da aplicação apontando para um PostgreSQL local)
+#   python benchmark_punch_ingest.py http://localhost:8000 usuario senha [quantidade_de_registros]
+#
+# Os registros usam matrículas fictícias (9999xxxxxx) e são gravados de verdade no banco.
+import json
+import sys
+import time
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+
+def post(url, payload, token=None, form=False):
+    if form:
+        body, content_type = urllib.parse.urlencode(payload).encode(), "application/x-www-form-urlencoded"
+    else:
+        body, content_type = json.dumps(payload).encode(), "application/json"
+    headers = {"Content-Type": content_type}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    with urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers)) as response:
+        return json.loads(response.read())
+
+def gerar_registros(quantidade, deslocamento_dias):
+    inicio = date(2000, 1, 1) + timedelta(days=deslocamento_dias)
+    return [
+        {
+            "employee_id": f"9999{i % 500:06d}",
+            "work_date": (inicio + timedelta(days=i // 500)).isoformat(),
+            "entry1": "08:00:00", "exit1": "12:00:00", "entry2": "13:00:00", "exit2": "17:00:00"
+        }
+        for i in range(quantidade)
+    ]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Uso: python benchmark_punch_ingest.py URL USUARIO SENHA [QUANTIDADE]")
+        sys.exit(1)
+    base_url, usuario, senha = sys.argv[1].rstrip("/"), sys.argv[2], sys.argv[3]
+    quantidade = int(sys.argv[4]) if len(sys.argv) > 4 else 2000
+    token = post(f"{base_url}/token", {"username": usuario, "password": senha}, form=True)["access_token"]
+
+    registros = gerar_registros(quantidade, 0)
+    inicio = time.perf_counter()
+    for registro in registros:
+        post(f"{base_url}/punches/external", registro, token)
+    individual = time.perf_counter() - inicio
+    print(f"Um POST por registro: {quantidade} registros em {individual:.2f} s ({quantidade / individual:.0f} registros/s)")
+
+    # Datas diferentes para medir inserções, como na primeira rodada
+    registros = gerar_registros(quantidade, 3650)
+    inicio = time.perf_counter()
+    resposta = post(f"{base_url}/punches/external/batch", {"punches": registros}, token)
+    lote = time.perf_counter() - inicio
+    print(f"POST em lote:         {quantidade} registros em {lote:.2f} s ({quantidade / lote:.0f} registros/s) - {resposta['message']}")
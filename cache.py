@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Cache em memória, compartilhado pelo processo, com expiração por tempo e contadores de acerto/erro.
+    Com `max_entries`, as chaves menos usadas recentemente são descartadas quando o limite é atingido.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna o valor guardado ou None se a chave não existir ou já tiver expirado."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self.hits += 1
+                    self._data.move_to_end(key)
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Remove todas as chaves (ou apenas as que satisfazem `predicate`). Retorna quantas foram removidas."""
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
+
+
+class SingleFlight:
+    """
+    Deduplica chamadas simultâneas: enquanto uma chamada com a mesma chave está em andamento,
+    as demais esperam e recebem o mesmo resultado (ou a mesma exceção) em vez de refazer o trabalho.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not is_leader:
+            return future.result()
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._calls), "executed": self.executed, "shared": self.shared}
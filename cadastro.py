@@ -1,16 +1,75 @@
 # cadastro.py
-import cv2
-import face_recognition
-import numpy as np
+# Gera a digital facial (encodings/face_recognition/<matricula>.npy) a partir das fotos em
+# fotos_referencia/<matricula>.jpg. É a pasta lida pela batida com foto (POST /punches/face).
+#
+# Uso:
+#   python cadastro.py                 (cadastra em lote todas as fotos novas ou alteradas)
+#   python cadastro.py --forcar        (refaz todas, mesmo as que não mudaram)
+#   python cadastro.py MATRICULA       (cadastra apenas uma matrícula)
+import csv
+import hashlib
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-# --- CONFIGURAÇÕES ---
-# Coloque aqui a matrícula da sua foto de referência
-MATRICULA = "0601000343" 
+import face_recognition
+
+import face_preprocessing
+from face_store import FACE_RECOGNITION_ENCODINGS_DIR, save_encoding
 
+# --- CONFIGURAÇÕES ---
 REFERENCE_DIR = "fotos_referencia"
-ENCODINGS_DIR = "encodings"
+ENCODINGS_DIR = FACE_RECOGNITION_ENCODINGS_DIR
 os.makedirs(ENCODINGS_DIR, exist_ok=True)
+# Hash do conteúdo de cada foto já cadastrada; fotos com o mesmo hash não são processadas de novo
+HASHES_PATH = os.path.join(ENCODINGS_DIR, "cadastro_hashes.json")
+# Relatório das fotos que falharam no último cadastro em lote
+FALHAS_PATH = "cadastro_falhas.csv"
+EXTENSOES_FOTO = (".jpg", ".jpeg", ".png")
+CADASTRO_WORKERS = int(os.getenv("CADASTRO_WORKERS", str(os.cpu_count() or 2)))
+
+
+class FalhaCadastro(Exception):
+    """Foto que não pode gerar encoding (ilegível ou sem rosto)."""
+
+
+def gerar_encoding(foto_path):
+    """Lê a foto e retorna o encoding do primeiro rosto encontrado. Levanta FalhaCadastro se não for possível."""
+    with open(foto_path, "rb") as foto:
+        foto_bytes = foto.read()
+
+    # Aplica a orientação EXIF e reduz a foto antes da detecção (ver face_preprocessing.py)
+    encoding_rosto, legivel = face_preprocessing.encode_face(face_recognition, foto_bytes)
+    if not legivel:
+        raise FalhaCadastro("Não foi possível ler a imagem. O arquivo pode estar corrompido ou em um formato inválido.")
+    if encoding_rosto is None:
+        raise FalhaCadastro("Nenhum rosto foi encontrado na imagem de referência. Tente uma foto mais nítida e de frente.")
+    return encoding_rosto
+
+
+def hash_arquivo(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def carregar_hashes():
+    if not os.path.exists(HASHES_PATH):
+        return {}
+    with open(HASHES_PATH, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def salvar_hashes(hashes):
+    temporario = HASHES_PATH + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(hashes, arquivo, indent=1, sort_keys=True)
+    os.replace(temporario, HASHES_PATH)
+
 
 def cadastrar_funcionario(matricula):
     print(f"--- Iniciando cadastro para a matrícula: {matricula} ---")
@@ -23,39 +82,102 @@ def cadastrar_funcionario(matricula):
         return
 
     try:
-        # Tenta carregar a imagem com OpenCV (Método Robusto)
-        print(f"1. Carregando imagem: {foto_path}")
-        imagem_bgr = cv2.imread(foto_path)
-        if imagem_bgr is None:
-            print("ERRO: OpenCV não conseguiu ler a imagem. O arquivo pode estar corrompido ou em um formato inválido.")
-            return
-
-        # Converte de BGR (padrão OpenCV) para RGB (padrão face_recognition)
-        print("2. Convertendo imagem para RGB...")
-        imagem_rgb = cv2.cvtColor(imagem_bgr, cv2.COLOR_BGR2RGB)
-
-        # Tenta encontrar o rosto e gerar o encoding
-        print("3. Procurando por rostos e gerando encoding...")
-        encodings = face_recognition.face_encodings(imagem_rgb)
-
-        if not encodings:
-            print("ERRO: Nenhum rosto foi encontrado na imagem de referência. Tente uma foto mais nítida e de frente.")
-            return
-
-        # Pega o encoding do primeiro rosto encontrado
-        encoding_rosto = encodings[0]
-        print("4. Encoding gerado com sucesso!")
+        print(f"1. Carregando imagem e gerando encoding: {foto_path}")
+        encoding_rosto = gerar_encoding(foto_path)
+        print("2. Encoding gerado com sucesso!")
 
         # Salva o encoding em um arquivo .npy (formato do NumPy)
-        encoding_path = os.path.join(ENCODINGS_DIR, f"{matricula}.npy")
-        np.save(encoding_path, encoding_rosto)
+        encoding_path = save_encoding(ENCODINGS_DIR, matricula, encoding_rosto)
+        hashes = carregar_hashes()
+        hashes[matricula] = hash_arquivo(foto_path)
+        salvar_hashes(hashes)
 
-        print(f"5. SUCESSO! Digital facial salva em: {encoding_path}")
+        print(f"3. SUCESSO! Digital facial salva em: {encoding_path}")
 
+    except FalhaCadastro as e:
+        print(f"ERRO: {e}")
     except Exception as e:
         print(f"\n!!!!!!!! OCORREU UM ERRO INESPERADO !!!!!!!!")
         print(f"Erro: {e}")
 
+
+def _cadastrar_foto(matricula, foto_path):
+    """Executado nos processos do pool: gera e grava o encoding de uma foto. Retorna (matrícula, erro ou None)."""
+    try:
+        encoding_rosto = gerar_encoding(foto_path)
+        save_encoding(ENCODINGS_DIR, matricula, encoding_rosto)
+        return matricula, None
+    except FalhaCadastro as e:
+        return matricula, str(e)
+    except Exception as e:
+        return matricula, f"Erro inesperado: {e}"
+
+
+def cadastrar_em_lote(forcar=False):
+    """
+    Cadastra todas as fotos de REFERENCE_DIR em paralelo (CADASTRO_WORKERS processos), pulando as fotos cujo
+    conteúdo não mudou desde o último cadastro. As falhas são gravadas em FALHAS_PATH.
+    """
+    inicio = time.perf_counter()
+    hashes = carregar_hashes()
+    pendentes = {}
+    falhas = []
+    fotos_por_matricula = {}
+    ignoradas = 0
+    for nome in sorted(os.listdir(REFERENCE_DIR)):
+        matricula, extensao = os.path.splitext(nome)
+        if extensao.lower() not in EXTENSOES_FOTO:
+            continue
+        foto_path = os.path.join(REFERENCE_DIR, nome)
+        # Mais de uma foto para a mesma matrícula (ex.: .jpg e .png): usa a primeira em ordem alfabética
+        # e registra as demais como falha, em vez de uma sobrescrever a outra sem aviso
+        if matricula in fotos_por_matricula:
+            motivo = f"Foto duplicada para a matrícula; usada {os.path.basename(fotos_por_matricula[matricula])}"
+            falhas.append((matricula, foto_path, motivo))
+            print(f"  FALHA {matricula}: {motivo}")
+            continue
+        fotos_por_matricula[matricula] = foto_path
+        conteudo_hash = hash_arquivo(foto_path)
+        encoding_existe = os.path.exists(os.path.join(ENCODINGS_DIR, f"{matricula}.npy"))
+        if not forcar and encoding_existe and hashes.get(matricula) == conteudo_hash:
+            ignoradas += 1
+            continue
+        pendentes[matricula] = (foto_path, conteudo_hash)
+
+    print(f"--- Cadastro em lote: {len(pendentes)} fotos para processar, {ignoradas} sem alteração ---")
+    cadastradas = 0
+    if pendentes:
+        with ProcessPoolExecutor(max_workers=CADASTRO_WORKERS) as pool:
+            futuros = [pool.submit(_cadastrar_foto, matricula, foto_path) for matricula, (foto_path, _) in pendentes.items()]
+            for futuro in as_completed(futuros):
+                matricula, erro = futuro.result()
+                foto_path, conteudo_hash = pendentes[matricula]
+                if erro:
+                    falhas.append((matricula, foto_path, erro))
+                    print(f"  FALHA {matricula}: {erro}")
+                    continue
+                cadastradas += 1
+                hashes[matricula] = conteudo_hash
+                # Grava a cada foto, para que uma execução interrompida não refaça o que já foi feito
+                salvar_hashes(hashes)
+
+    with open(FALHAS_PATH, "w", newline="", encoding="utf-8") as arquivo:
+        writer = csv.writer(arquivo, delimiter=";")
+        writer.writerow(["matricula", "arquivo", "motivo"])
+        writer.writerows(sorted(falhas))
+
+    duracao = time.perf_counter() - inicio
+    print(f"--- Concluído em {duracao:.1f} s: {cadastradas} cadastradas, {len(falhas)} falhas, {ignoradas} sem alteração ---")
+    if falhas:
+        print(f"Detalhes das falhas em: {FALHAS_PATH}")
+    return {"cadastradas": cadastradas, "falhas": falhas, "ignoradas": ignoradas}
+
+
 # --- Ponto de entrada do script ---
 if __name__ == "__main__":
-    cadastrar_funcionario(MATRICULA)
\ No newline at end of file
+    argumentos = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if argumentos:
+        for matricula in argumentos:
+            cadastrar_funcionario(matricula)
+    else:
+        cadastrar_em_lote(forcar="--forcar" in sys.argv)
@@ -0,0 +1,33 @@
+# conftest.py
+# main.py conecta nos bancos ao ser importado. Os testes das funções puras de main.py leem as definições
+# necessárias do código-fonte (ast) e as executam isoladamente, com as dependências informadas pelo teste.
+import ast
+import os
+
+import pytest
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def _load_main_definitions(names, **namespace):
+    """
+    Executa apenas as funções, classes e atribuições de nível de módulo de main.py cujos nomes estão em `names`.
+    `namespace` fornece o que essas definições usam (módulos, constantes, feriados...). Retorna o namespace.
+    """
+    with open(MAIN_PATH, encoding="utf-8") as source_file:
+        tree = ast.parse(source_file.read())
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in names:
+            body.append(node)
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id in names for t in node.targets):
+            body.append(node)
+    exec(compile(ast.Module(body=body, type_ignores=[]), MAIN_PATH, "exec"), namespace)
+    missing = [name for name in names if name not in namespace]
+    assert not missing, f"Definições não encontradas em main.py: {missing}"
+    return namespace
+
+
+@pytest.fixture(scope="session")
+def load_from_main():
+    return _load_main_definitions
@@ -0,0 +1,189 @@
+# deepface_references.py
+# Embeddings de referência do DeepFace pré-calculados por modelo, a partir de fotos_referencia/.
+# DeepFace.verify(referência, batida) detecta e gera o embedding das duas fotos a cada comparação; com as
+# referências guardadas, a verificação só processa a foto da batida e compara vetores.
+#
+# Cada modelo tem a própria pasta (encodings/deepface/<modelo>/<matricula>.npy), indexada por face_store.
+#
+# Uso:
+#   python deepface_references.py construir [MODELO ...]               (padrão: VGG-Face)
+#   python deepface_references.py comparar FOTO MATRICULA [MODELO ...] (tempo e resultado de cada modelo)
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+import face_preprocessing
+from face_store import ENCODINGS_DIR, FaceEmbeddingStore, save_encoding
+
+REFERENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fotos_referencia")
+DEEPFACE_ENCODINGS_DIR = os.path.join(ENCODINGS_DIR, "deepface")
+DEFAULT_MODEL_NAME = "VGG-Face"
+DETECTOR_BACKEND = os.getenv("DEEPFACE_DETECTOR_BACKEND", "opencv")
+# Limiares de distância de cosseno usados pelo próprio DeepFace para cada modelo
+COSINE_THRESHOLDS = {
+    "VGG-Face": 0.68,
+    "Facenet": 0.40,
+    "Facenet512": 0.30,
+    "ArcFace": 0.68,
+    "Dlib": 0.07,
+    "SFace": 0.593,
+    "OpenFace": 0.10,
+    "DeepFace": 0.23,
+    "DeepID": 0.015,
+    "GhostFaceNet": 0.65,
+}
+HASHES_FILENAME = "hashes.json"
+
+_stores: Dict[str, FaceEmbeddingStore] = {}
+
+
+class DeepFaceReferenceError(Exception):
+    """Foto sem rosto detectável, ilegível, ou matrícula sem referência para o modelo."""
+
+
+def model_dir(model_name: str) -> str:
+    return os.path.join(DEEPFACE_ENCODINGS_DIR, model_name)
+
+
+def get_store(model_name: str) -> FaceEmbeddingStore:
+    """Índice das referências do modelo, sempre com distância de cosseno e o limiar do DeepFace."""
+    if model_name not in _stores:
+        os.makedirs(model_dir(model_name), exist_ok=True)
+        _stores[model_name] = FaceEmbeddingStore(model_dir(model_name), metric="cosine", tolerance=COSINE_THRESHOLDS.get(model_name))
+    return _stores[model_name]
+
+
+def represent(image_bytes: bytes, model_name: str) -> np.ndarray:
+    """Embedding do primeiro rosto da foto, já com a preparação de face_preprocessing (orientação e redução)."""
+    from deepface import DeepFace
+
+    image = face_preprocessing.prepare_image(image_bytes, model_name)
+    if image is None:
+        raise DeepFaceReferenceError("Não foi possível ler a imagem.")
+    try:
+        # O DeepFace espera arrays em BGR, como o OpenCV
+        faces = DeepFace.represent(img_path=image[:, :, ::-1], model_name=model_name, detector_backend=DETECTOR_BACKEND, enforce_detection=True)
+    except ValueError as e:
+        raise DeepFaceReferenceError(f"Nenhum rosto foi encontrado na imagem: {e}")
+    return np.asarray(faces[0]["embedding"], dtype=np.float32)
+
+
+def _remove_orphans(directory: str, hashes: Dict[str, str], employee_ids: Set[str]) -> List[str]:
+    """Apaga as referências (.npy e entrada em hashes) de matrículas cuja foto saiu de REFERENCE_DIR."""
+    stored = {name[:-4] for name in os.listdir(directory) if name.endswith(".npy")}
+    orphans = sorted((stored | set(hashes)) - employee_ids)
+    for employee_id in orphans:
+        embedding_path = os.path.join(directory, f"{employee_id}.npy")
+        if os.path.exists(embedding_path):
+            os.remove(embedding_path)
+        hashes.pop(employee_id, None)
+    return orphans
+
+
+def _save_hashes(hashes_path: str, hashes: Dict[str, str]) -> None:
+    temporary = hashes_path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as hashes_file:
+        json.dump(hashes, hashes_file, indent=1, sort_keys=True)
+    os.replace(temporary, hashes_path)
+
+
+def build_references(model_name: str = DEFAULT_MODEL_NAME, force: bool = False) -> Dict[str, Any]:
+    """
+    Gera as referências do modelo para as fotos de REFERENCE_DIR. Fotos cujo conteúdo não mudou desde a última
+    execução são puladas, e as referências de fotos removidas são apagadas; o índice do modelo é atualizado no final.
+    Cada .npy é gravado em um arquivo temporário e trocado com os.replace (ver face_store.save_encoding).
+    """
+    from deepface import DeepFace
+
+    DeepFace.build_model(model_name)
+    directory = model_dir(model_name)
+    os.makedirs(directory, exist_ok=True)
+    hashes_path = os.path.join(directory, HASHES_FILENAME)
+    hashes = {}
+    if os.path.exists(hashes_path):
+        with open(hashes_path, encoding="utf-8") as hashes_file:
+            hashes = json.load(hashes_file)
+
+    photo_paths = sorted(glob.glob(os.path.join(REFERENCE_DIR, "*.jpg")))
+    removed = _remove_orphans(directory, hashes, {os.path.splitext(os.path.basename(path))[0] for path in photo_paths})
+    built, skipped, failures = 0, 0, []
+    for photo_path in photo_paths:
+        employee_id = os.path.splitext(os.path.basename(photo_path))[0]
+        with open(photo_path, "rb") as photo:
+            photo_bytes = photo.read()
+        content_hash = hashlib.sha256(photo_bytes).hexdigest()
+        embedding_path = os.path.join(directory, f"{employee_id}.npy")
+        if not force and hashes.get(employee_id) == content_hash and os.path.exists(embedding_path):
+            skipped += 1
+            continue
+        try:
+            save_encoding(directory, employee_id, represent(photo_bytes, model_name))
+        except DeepFaceReferenceError as e:
+            failures.append({"employee_id": employee_id, "error": str(e)})
+            continue
+        hashes[employee_id] = content_hash
+        built += 1
+
+    _save_hashes(hashes_path, hashes)
+    index = get_store(model_name).rebuild()
+    return {"model_name": model_name, "built": built, "skipped": skipped, "removed": removed, "failures": failures,
+            "employees": index["employees"]}
+
+
+def verify(employee_id: str, image_bytes: bytes, model_name: str = DEFAULT_MODEL_NAME) -> Dict[str, Any]:
+    """Compara a foto com a referência guardada da matrícula: só a foto da batida passa pelo modelo."""
+    store = get_store(model_name)
+    store.refresh_if_changed()
+    reference = store.get_encoding(employee_id)
+    if reference is None:
+        raise DeepFaceReferenceError(f"A matrícula {employee_id} não possui referência para o modelo {model_name}.")
+    start = time.perf_counter()
+    probe = represent(image_bytes, model_name)
+    reference = reference.reshape(1, -1)
+    distance = float(store.distances(probe, reference, np.sqrt(np.einsum("ij,ij->i", reference, reference)))[0])
+    return {
+        "verified": distance <= store.tolerance,
+        "distance": distance,
+        "tolerance": store.tolerance,
+        "model_name": model_name,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+        "best_match": (store.identify(probe, top_k=1) or [None])[0],
+    }
+
+
+def _models_from_args(args: List[str]) -> List[str]:
+    return args or [DEFAULT_MODEL_NAME]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("construir", "comparar") or (sys.argv[1] == "comparar" and len(sys.argv) < 4):
+        print("Uso: python deepface_references.py construir [MODELO ...]")
+        print("     python deepface_references.py comparar FOTO MATRICULA [MODELO ...]")
+        sys.exit(1)
+
+    if sys.argv[1] == "construir":
+        for model in _models_from_args(sys.argv[2:]):
+            inicio = time.perf_counter()
+            resumo = build_references(model)
+            print(f"{model}: {resumo['built']} geradas, {resumo['skipped']} sem alteração, {len(resumo['removed'])} removidas, "
+                  f"{len(resumo['failures'])} falhas, {resumo['employees']} no índice ({time.perf_counter() - inicio:.1f} s)")
+            for falha in resumo["failures"]:
+                print(f"  FALHA {falha['employee_id']}: {falha['error']}")
+    else:
+        foto_path, matricula = sys.argv[2], sys.argv[3]
+        with open(foto_path, "rb") as foto:
+            foto_bytes = foto.read()
+        print(f"{'modelo':<14} {'tempo (ms)':>10} {'distância':>10} {'limiar':>7}  resultado      mais parecido")
+        for model in _models_from_args(sys.argv[4:]):
+            build_references(model)
+            verify(matricula, foto_bytes, model) # aquecimento: a primeira inferência inclui a carga do modelo
+            resultado = verify(matricula, foto_bytes, model)
+            melhor: Optional[dict] = resultado["best_match"]
+            print(f"{model:<14} {resultado['elapsed_ms']:>10.0f} {resultado['distance']:>10.4f} {resultado['tolerance']:>7}  "
+                  f"{'mesma pessoa' if resultado['verified'] else 'diferente':<14} {melhor['employee_id'] if melhor else '-'}")
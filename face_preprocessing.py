@@ -0,0 +1,90 @@
+# face_preprocessing.py
+# Preparação das fotos antes da detecção facial, usada pelo cadastro e pela verificação das batidas.
+# O custo da detecção cresce com o número de pixels; com a redução ativada, fotos de celular (12 MP) são
+# decodificadas já reduzidas, com a orientação EXIF aplicada, até o lado máximo configurado.
+import hashlib
+import io
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from cache import TTLCache
+
+# Lado máximo (px) da imagem entregue ao modelo (0 = sem redução) e uso do cache de recorte do rosto.
+# A redução fica desligada até benchmark_face_preprocessing.py confirmar, com as fotos reais, que as decisões
+# de "mesma pessoa" não mudam; para ativá-la, defina FACE_PREPROCESS_MAX_SIDE (ex.: 800).
+# O cache guarda a posição do rosto por conteúdo da imagem e evita uma nova detecção quando a mesma foto
+# volta a ser processada (recadastro, conferência de modelos); não ajuda em fotos de batida, sempre novas.
+PREPROCESS_SETTINGS = {
+    "face_recognition": {"max_side": 0, "face_crop_cache": True},
+    "VGG-Face": {"max_side": 0, "face_crop_cache": False},
+}
+DEFAULT_PREPROCESS_SETTINGS = {"max_side": 0, "face_crop_cache": False}
+FACE_PREPROCESS_MAX_SIDE = os.getenv("FACE_PREPROCESS_MAX_SIDE")
+FACE_CROP_CACHE_ENTRIES = int(os.getenv("FACE_CROP_CACHE_ENTRIES", "2048"))
+
+face_crop_cache = TTLCache(ttl_seconds=float(os.getenv("FACE_CROP_CACHE_TTL_SECONDS", "86400")), max_entries=FACE_CROP_CACHE_ENTRIES)
+
+
+def get_settings(model_name: str) -> dict:
+    settings = dict(PREPROCESS_SETTINGS.get(model_name, DEFAULT_PREPROCESS_SETTINGS))
+    if FACE_PREPROCESS_MAX_SIDE is not None:
+        settings["max_side"] = int(FACE_PREPROCESS_MAX_SIDE)
+    return settings
+
+
+def prepare_image(image_bytes: bytes, model_name: str) -> Optional[np.ndarray]:
+    """
+    Decodifica a foto em RGB, aplica a orientação EXIF e, se a redução estiver ativada, reduz o maior lado a `max_side`.
+    Retorna None se a imagem não puder ser lida.
+    """
+    # Pillow vem junto com face_recognition/deepface; importado aqui para que a API suba sem essas dependências
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    max_side = get_settings(model_name)["max_side"]
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        if max_side:
+            # Em JPEG, decodifica direto em escala reduzida (1/2, 1/4, 1/8), sem montar a imagem inteira
+            image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return np.asarray(image)
+
+
+def image_key(image_bytes: bytes, model_name: str) -> Tuple[str, str, int]:
+    return (model_name, hashlib.sha1(image_bytes).hexdigest(), get_settings(model_name)["max_side"])
+
+
+def cached_face_locations(image_bytes: bytes, model_name: str) -> Optional[List[tuple]]:
+    """Posições de rosto já detectadas para esta foto (mesmo conteúdo e mesma redução), se o cache estiver ativo."""
+    if not get_settings(model_name)["face_crop_cache"]:
+        return None
+    return face_crop_cache.get(image_key(image_bytes, model_name))
+
+
+def remember_face_locations(image_bytes: bytes, model_name: str, locations: List[tuple]) -> None:
+    if get_settings(model_name)["face_crop_cache"] and locations:
+        face_crop_cache.set(image_key(image_bytes, model_name), locations)
+
+
+def encode_face(face_recognition, image_bytes: bytes) -> Tuple[Optional[np.ndarray], bool]:
+    """
+    Preparação + detecção + encoding com face_recognition. Retorna (encoding do primeiro rosto ou None,
+    imagem legível). Recebe o módulo já importado para que o chamador controle quando o modelo é carregado.
+    """
+    image = prepare_image(image_bytes, "face_recognition")
+    if image is None:
+        return None, False
+    locations = cached_face_locations(image_bytes, "face_recognition")
+    if locations is None:
+        locations = face_recognition.face_locations(image)
+        remember_face_locations(image_bytes, "face_recognition", locations)
+    if not locations:
+        return None, True
+    encodings = face_recognition.face_encodings(image, known_face_locations=locations[:1])
+    return (encodings[0] if encodings else None), True
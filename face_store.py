@@ -0,0 +1,268 @@
+# face_store.py
+# Consolida os encodings faciais de uma pasta (<pasta>/<matricula>.npy) em uma única matriz float32 contígua,
+# lida por memory-map, com as matrículas em um arquivo ao lado. A identificação 1:N compara a foto contra todos
+# os funcionários com uma única operação de matriz.
+#
+# Cada modelo tem a própria pasta: vetores de modelos diferentes não são comparáveis, e uma pasta misturada
+# deixaria parte das matrículas fora do índice. Os encodings do cadastro.py (face_recognition/dlib, 128
+# dimensões) ficam em encodings/face_recognition/; os do DeepFace em encodings/deepface/<modelo>/.
+#
+# Uso:
+#   python face_store.py               (reconstrói o índice e mostra quantos funcionários ele contém)
+#   python face_store.py MATRICULA     (usa o encoding salvo da matrícula como consulta e mede o tempo)
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENCODINGS_DIR = os.path.join(BASE_DIR, "encodings")
+FACE_RECOGNITION_ENCODINGS_DIR = os.path.join(ENCODINGS_DIR, "face_recognition")
+# O índice fica em uma subpasta para não se confundir com os encodings dos funcionários
+INDEX_DIRNAME = "_index"
+INDEX_MANIFEST = "manifest.json"
+# Métrica e distância máxima para considerar o mesmo rosto. Sem configuração, a métrica segue a dimensão do
+# encoding: 128 (face_recognition/dlib) usa distância euclidiana; os demais (DeepFace, ex: VGG-Face com 4096)
+# usam distância de cosseno. As tolerâncias padrão são as das próprias bibliotecas.
+FACE_MATCH_METRIC = os.getenv("FACE_MATCH_METRIC")
+DEFAULT_TOLERANCES = {"euclidean": 0.6, "cosine": 0.68}
+FACE_MATCH_TOLERANCE = float(os.environ["FACE_MATCH_TOLERANCE"]) if os.getenv("FACE_MATCH_TOLERANCE") else None
+
+# Intervalo mínimo entre verificações arquivo a arquivo (mtime e tamanho de cada .npy) em refresh_if_changed.
+# Arquivos novos ou removidos mudam o mtime da pasta e são percebidos na hora; um .npy regravado no lugar não.
+FACE_STORE_SCAN_INTERVAL_SECONDS = float(os.getenv("FACE_STORE_SCAN_INTERVAL_SECONDS", "5"))
+
+def default_metric(dimension: int) -> str:
+    return FACE_MATCH_METRIC or ("euclidean" if dimension == 128 else "cosine")
+
+def save_encoding(directory: str, employee_id: str, encoding: np.ndarray) -> str:
+    """
+    Grava <employee_id>.npy em um arquivo temporário e o coloca no lugar com os.replace, para que nenhum leitor
+    veja o arquivo pela metade e a entrada da pasta mude (o índice percebe a troca pelo mtime da pasta).
+    """
+    path = os.path.join(directory, f"{employee_id}.npy")
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as encoding_file:
+        np.save(encoding_file, encoding)
+    os.replace(temporary, path)
+    return path
+
+
+class FaceEmbeddingStore:
+    """
+    Índice em memória (memory-map) dos encodings faciais.
+
+    O arquivo de manifesto guarda a ordem das matrículas na matriz e o (mtime, tamanho) de cada .npy de
+    origem; a reconstrução só relê os arquivos novos ou alterados e reaproveita as demais linhas da matriz.
+    Cada reconstrução grava a matriz com um número de geração novo, porque no Windows um arquivo aberto por
+    memory-map não pode ser substituído.
+    """
+
+    def __init__(self, encodings_dir: str = FACE_RECOGNITION_ENCODINGS_DIR, metric: Optional[str] = None, tolerance: Optional[float] = None,
+                 scan_interval_seconds: float = FACE_STORE_SCAN_INTERVAL_SECONDS):
+        self.encodings_dir = encodings_dir
+        # Sem valores explícitos, métrica e tolerância seguem a configuração global (ver default_metric)
+        self._metric = metric
+        self._tolerance = tolerance
+        self.index_dir = os.path.join(encodings_dir, INDEX_DIRNAME)
+        self._lock = threading.Lock()
+        self.scan_interval_seconds = scan_interval_seconds
+        self._dir_mtime_ns: Optional[int] = None
+        self._sources: Dict[str, Tuple[int, int]] = {}
+        self._last_scan = 0.0
+        # (matriz, normas das linhas, matrículas); trocado de uma vez para leituras sem lock
+        self._snapshot: Tuple[np.ndarray, np.ndarray, List[str]] = (np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32), [])
+
+    def _scan_sources(self) -> Dict[str, Tuple[int, int]]:
+        sources = {}
+        with os.scandir(self.encodings_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".npy"):
+                    stat = entry.stat()
+                    sources[entry.name[:-4]] = (stat.st_mtime_ns, stat.st_size)
+        return sources
+
+    def _read_manifest(self) -> Optional[dict]:
+        path = os.path.join(self.index_dir, INDEX_MANIFEST)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifesto do índice facial ilegível, o índice será refeito: {e}")
+            return None
+
+    def _load_matrix(self, manifest: dict) -> Optional[np.ndarray]:
+        path = os.path.join(self.index_dir, manifest["matrix"])
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def rebuild(self) -> Dict[str, int]:
+        """Atualiza a matriz a partir da pasta de encodings. Retorna quantas linhas foram reaproveitadas e relidas."""
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            dir_mtime_ns = os.stat(self.encodings_dir).st_mtime_ns
+            sources = self._scan_sources()
+            manifest = self._read_manifest()
+            previous_matrix = self._load_matrix(manifest) if manifest else None
+            previous_rows = {}
+            if previous_matrix is not None:
+                previous_rows = {employee_id: row for row, employee_id in enumerate(manifest["ids"])}
+
+            ids = sorted(sources)
+            reused = [employee_id for employee_id in ids
+                      if employee_id in previous_rows and tuple(manifest["sources"].get(employee_id, ())) == sources[employee_id]]
+            if previous_matrix is not None and len(reused) == len(ids) == len(manifest["ids"]):
+                self._publish(previous_matrix, list(manifest["ids"]), dir_mtime_ns, sources)
+                return {"employees": len(ids), "reused": len(ids), "loaded": 0}
+
+            reused_set = set(reused)
+            vectors, kept_ids, kept_sources = [], [], {}
+            dimension = previous_matrix.shape[1] if previous_matrix is not None else None
+            loaded = 0
+            for employee_id in ids:
+                if employee_id in reused_set:
+                    vector = previous_matrix[previous_rows[employee_id]]
+                else:
+                    try:
+                        vector = np.load(os.path.join(self.encodings_dir, f"{employee_id}.npy")).astype(np.float32).ravel()
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Encoding de {employee_id} ignorado: {e}")
+                        continue
+                    loaded += 1
+                if dimension is None:
+                    dimension = vector.shape[0]
+                if vector.shape[0] != dimension:
+                    logger.warning(f"Encoding de {employee_id} ignorado: dimensão {vector.shape[0]}, esperado {dimension} "
+                                   f"(a pasta {self.encodings_dir} deve ter encodings de um único modelo).")
+                    continue
+                vectors.append(vector)
+                kept_ids.append(employee_id)
+                kept_sources[employee_id] = sources[employee_id]
+
+            matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32) if vectors else np.empty((0, dimension or 0), dtype=np.float32)
+            generation = (manifest["generation"] + 1) if manifest else 1
+            matrix_name = f"embeddings_{generation}.npy"
+            np.save(os.path.join(self.index_dir, matrix_name), matrix)
+            new_manifest = {"generation": generation, "matrix": matrix_name, "ids": kept_ids, "sources": kept_sources}
+            manifest_tmp = os.path.join(self.index_dir, INDEX_MANIFEST + ".tmp")
+            with open(manifest_tmp, "w", encoding="utf-8") as manifest_file:
+                json.dump(new_manifest, manifest_file)
+            os.replace(manifest_tmp, os.path.join(self.index_dir, INDEX_MANIFEST))
+
+            self._publish(np.load(os.path.join(self.index_dir, matrix_name), mmap_mode="r"), kept_ids, dir_mtime_ns, sources)
+            self._remove_old_generations(matrix_name)
+            logger.info(f"Índice facial atualizado: {len(kept_ids)} funcionários ({len(reused)} reaproveitados, {loaded} lidos).")
+            return {"employees": len(kept_ids), "reused": len(reused), "loaded": loaded}
+
+    def _publish(self, matrix: np.ndarray, ids: List[str], dir_mtime_ns: int, sources: Dict[str, Tuple[int, int]]) -> None:
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix)) if len(ids) else np.empty(0, dtype=np.float32)
+        self._snapshot = (matrix, norms, ids)
+        self._dir_mtime_ns = dir_mtime_ns
+        self._sources = sources
+        self._last_scan = time.monotonic()
+
+    def _remove_old_generations(self, current: str) -> None:
+        for name in os.listdir(self.index_dir):
+            if name.startswith("embeddings_") and name != current:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    # Ainda aberto por outro processo (Windows); será removido em uma próxima reconstrução
+                    pass
+
+    def refresh_if_changed(self) -> None:
+        """
+        Reconstrói o índice se um .npy foi adicionado ou removido (mtime da pasta, a cada chamada) ou regravado
+        no lugar ((mtime, tamanho) de cada arquivo, no máximo a cada scan_interval_seconds).
+        """
+        if os.stat(self.encodings_dir).st_mtime_ns != self._dir_mtime_ns:
+            self.rebuild()
+            return
+        if time.monotonic() - self._last_scan < self.scan_interval_seconds:
+            return
+        self._last_scan = time.monotonic()
+        if self._scan_sources() != self._sources:
+            self.rebuild()
+
+    def __len__(self) -> int:
+        return len(self._snapshot[2])
+
+    def get_encoding(self, employee_id: str) -> Optional[np.ndarray]:
+        matrix, _, ids = self._snapshot
+        try:
+            return np.asarray(matrix[ids.index(employee_id)])
+        except ValueError:
+            return None
+
+    @property
+    def dimension(self) -> int:
+        return self._snapshot[0].shape[1]
+
+    @property
+    def metric(self) -> str:
+        return self._metric or default_metric(self.dimension)
+
+    @property
+    def tolerance(self) -> float:
+        if self._tolerance is not None:
+            return self._tolerance
+        return FACE_MATCH_TOLERANCE if FACE_MATCH_TOLERANCE is not None else DEFAULT_TOLERANCES[self.metric]
+
+    def distances(self, probe: np.ndarray, matrix: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        """Distância de `probe` a cada linha de `matrix`, com um único produto matriz-vetor."""
+        probe = np.asarray(probe, dtype=np.float32).ravel()
+        dots = matrix @ probe
+        probe_norm = float(np.sqrt(probe @ probe))
+        if self.metric == "euclidean":
+            # |a - b|² = |a|² - 2 a·b + |b|²
+            return np.sqrt(np.maximum(norms * norms - 2.0 * dots + probe_norm * probe_norm, 0.0))
+        return 1.0 - dots / np.maximum(norms * probe_norm, np.finfo(np.float32).tiny)
+
+    def identify(self, probe: np.ndarray, top_k: int = 5) -> List[Dict[str, object]]:
+        """
+        Compara o encoding `probe` com todos os funcionários e retorna os `top_k` mais próximos, do menor para
+        o maior, com a distância e se ela está dentro da tolerância.
+        """
+        self.refresh_if_changed()
+        matrix, norms, ids = self._snapshot
+        if not ids:
+            return []
+        distances = self.distances(probe, matrix, norms)
+        tolerance = self.tolerance
+        k = min(top_k, len(ids))
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates = candidates[np.argsort(distances[candidates])]
+        return [
+            {"employee_id": ids[row], "distance": float(distances[row]), "match": bool(distances[row] <= tolerance)}
+            for row in candidates
+        ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    store = FaceEmbeddingStore()
+    summary = store.rebuild()
+    print(f"Índice facial: {summary['employees']} funcionários ({summary['reused']} reaproveitados, {summary['loaded']} lidos).")
+    if len(sys.argv) > 1:
+        probe = store.get_encoding(sys.argv[1])
+        if probe is None:
+            print(f"ERRO: matrícula {sys.argv[1]} não está no índice.")
+            sys.exit(1)
+        repeticoes = 1000
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            matches = store.identify(probe)
+        duracao_ms = (time.perf_counter() - inicio) * 1000 / repeticoes
+        print(f"Identificação 1:{len(store)} em {duracao_ms:.3f} ms por consulta.")
+        for match in matches:
+            print(f"  {match['employee_id']}: distância {match['distance']:.4f}{' (mesma pessoa)' if match['match'] else ''}")
@@ -0,0 +1,83 @@
+# face_verification.py
+# Verificação facial das batidas com foto. O modelo (face_recognition/dlib) é carregado e aquecido uma vez
+# por processo, no startup da API, para que nenhuma requisição pague o tempo de inicialização.
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+import face_preprocessing
+from face_store import FaceEmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FACE_PHOTOS_DIR = os.path.join(BASE_DIR, "fotos_batidas")
+FACE_MODEL_NAME = "face_recognition"
+
+
+class FaceVerificationError(Exception):
+    """Foto ou cadastro que não permite a verificação (imagem ilegível, sem rosto, matrícula sem encoding)."""
+
+
+class FaceVerifier:
+    def __init__(self, store: FaceEmbeddingStore):
+        self.store = store
+        self.model_name = FACE_MODEL_NAME
+        self._face_recognition = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._face_recognition is not None
+
+    def load(self) -> float:
+        """Importa o modelo, roda uma detecção de aquecimento e carrega o índice de encodings. Retorna o tempo gasto."""
+        with self._load_lock:
+            if self.loaded:
+                return 0.0
+            start = time.perf_counter()
+            import face_recognition
+            # A primeira chamada inicializa os detectores e a rede do dlib
+            face_recognition.face_encodings(np.zeros((64, 64, 3), dtype=np.uint8))
+            self.store.rebuild()
+            self._face_recognition = face_recognition
+            elapsed = time.perf_counter() - start
+            logger.info(f"Modelo de reconhecimento facial carregado em {elapsed:.2f} s ({len(self.store)} funcionários no índice).")
+            if not len(self.store):
+                logger.warning(f"Nenhum encoding em {self.store.encodings_dir}; rode 'python cadastro.py' para cadastrar as fotos de referência.")
+            return elapsed
+
+    def encode(self, image_bytes: bytes) -> np.ndarray:
+        encoding, readable = face_preprocessing.encode_face(self._face_recognition, image_bytes)
+        if not readable:
+            raise FaceVerificationError("Não foi possível ler a imagem enviada.")
+        if encoding is None:
+            raise FaceVerificationError("Nenhum rosto foi encontrado na foto.")
+        return encoding
+
+    def verify(self, employee_id: str, image_bytes: bytes) -> Dict[str, Any]:
+        """Compara a foto com o encoding cadastrado da matrícula."""
+        if not self.loaded:
+            raise FaceVerificationError("O modelo de reconhecimento facial não está carregado.")
+        self.store.refresh_if_changed()
+        reference = self.store.get_encoding(employee_id)
+        if reference is None:
+            raise FaceVerificationError(f"A matrícula {employee_id} não possui cadastro facial (python cadastro.py {employee_id}).")
+        start = time.perf_counter()
+        probe = self.encode(image_bytes)
+        if probe.shape[0] != reference.shape[0]:
+            raise FaceVerificationError(f"O cadastro facial da matrícula {employee_id} foi gerado por outro modelo; refaça o cadastro.")
+        reference = reference.reshape(1, -1)
+        distance = float(self.store.distances(probe, reference, np.sqrt(np.einsum("ij,ij->i", reference, reference)))[0])
+        tolerance = self.store.tolerance
+        return {
+            "verified": distance <= tolerance,
+            "distance": distance,
+            "tolerance": tolerance,
+            "model_name": self.model_name,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
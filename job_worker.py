@@ -0,0 +1,27 @@
+# job_worker.py
+# Processos que executam os trabalhos em segundo plano enfileirados pela API (relatórios e importações).
+#
+# Uso:
+#   python job_worker.py [quantidade_de_processos]
+import logging
+import multiprocessing
+import os
+import sys
+
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+
+def _worker_process():
+    # Importado dentro do processo: cada worker cria as próprias conexões com os bancos
+    import jobs
+    import main
+    from database import SessionLocal_App
+    jobs.run_worker(SessionLocal_App, main.JOB_HANDLERS)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    process_count = int(sys.argv[1]) if len(sys.argv) > 1 else JOB_WORKER_PROCESSES
+    processes = [multiprocessing.Process(target=_worker_process, name=f"job-worker-{i + 1}") for i in range(process_count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,112 @@
+# jobs.py
+# Fila de trabalhos em segundo plano guardada no PostgreSQL da aplicação (tabela background_jobs).
+# Os endpoints apenas enfileiram; os processos de job_worker.py executam os trabalhos e registram o progresso.
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Arquivos enviados para os trabalhos e arquivos de resultado para download
+JOB_FILES_DIR = os.path.join(BASE_DIR, "job_files")
+os.makedirs(JOB_FILES_DIR, exist_ok=True)
+
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+# Um trabalho "running" sem atualização há mais tempo que isso é considerado abandonado (worker caiu) e volta à fila
+JOB_STALE_MINUTES = int(os.getenv("JOB_STALE_MINUTES", "30"))
+
+class JobProgress:
+    """
+    Entregue ao handler do trabalho para registrar o andamento em background_jobs.
+    Usa uma sessão própria, para não confirmar (commit) a transação em andamento do handler.
+    """
+
+    def __init__(self, db: Session, job: models.BackgroundJob):
+        self._bind = db.get_bind()
+        self._job_id = job.id
+
+    def __call__(self, progress: int, message: Optional[str] = None) -> None:
+        values = {"progress": max(0, min(100, int(progress))), "updated_at": datetime.now()}
+        if message is not None:
+            values["message"] = message
+        with Session(bind=self._bind) as progress_db:
+            progress_db.query(models.BackgroundJob).filter(models.BackgroundJob.id == self._job_id).update(values)
+            progress_db.commit()
+
+def job_file_path(job_id: str, extension: str) -> str:
+    return os.path.join(JOB_FILES_DIR, f"{job_id}{extension}")
+
+def enqueue_job(db: Session, job_type: str, payload: Dict[str, Any], created_by: Optional[str] = None, job_id: Optional[str] = None) -> models.BackgroundJob:
+    now = datetime.now()
+    job = models.BackgroundJob(
+        id=job_id or uuid.uuid4().hex, job_type=job_type, status="queued", progress=0,
+        message="Aguardando processamento.", payload=json.dumps(payload, default=str),
+        created_by=created_by, created_at=now, updated_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def claim_next_job(db: Session) -> Optional[models.BackgroundJob]:
+    """Reserva o trabalho mais antigo da fila. SKIP LOCKED permite vários workers sem disputa pela mesma linha."""
+    job_id = db.execute(text("""
+        UPDATE background_jobs SET status = 'running', updated_at = now()
+        WHERE id = (
+            SELECT id FROM background_jobs
+            WHERE status = 'queued' OR (status = 'running' AND updated_at < :stale_before)
+            ORDER BY created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id
+    """), {"stale_before": datetime.now() - timedelta(minutes=JOB_STALE_MINUTES)}).scalar()
+    db.commit()
+    return db.get(models.BackgroundJob, job_id) if job_id else None
+
+def run_job(db: Session, job: models.BackgroundJob, handlers: Dict[str, Callable]) -> None:
+    handler = handlers.get(job.job_type)
+    try:
+        if handler is None:
+            raise ValueError(f"Tipo de trabalho desconhecido: {job.job_type}")
+        logger.info(f"Iniciando trabalho {job.id} ({job.job_type}).")
+        result = handler(db, json.loads(job.payload or "{}"), job, JobProgress(db, job))
+        job.status = "done"
+        job.progress = 100
+        job.result = json.dumps(result, default=str) if result is not None else None
+        job.message = "Concluído."
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro no trabalho {job.id} ({job.job_type}): {e}", exc_info=True)
+        job.status = "failed"
+        job.error = str(e)
+        job.message = "Falhou."
+    job.updated_at = job.finished_at = datetime.now()
+    db.commit()
+
+def run_worker(session_factory, handlers: Dict[str, Callable]) -> None:
+    """Laço de um processo worker: reserva, executa e repete; dorme quando a fila está vazia."""
+    logger.info(f"Worker de trabalhos iniciado (pid {os.getpid()}).")
+    while True:
+        db = session_factory()
+        try:
+            job = claim_next_job(db)
+            if job is not None:
+                run_job(db, job, handlers)
+        except Exception as e:
+            logger.error(f"Erro no worker de trabalhos: {e}", exc_info=True)
+            job = None
+        finally:
+            db.close()
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL_SECONDS)
@@ -1,24 +1,43 @@
+import io
+import json
 import logging
+import shutil
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.staticfiles import StaticFiles
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import tuple_, literal_column, text, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from datetime import date, datetime, time, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 from pydantic import BaseModel
 import holidays
 import calendar
 import pandas as pd
-from fastapi import File, UploadFile
+from fastapi import File, Form, UploadFile
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.middleware.cors import CORSMiddleware
 
 import models
-from database import SessionLocal_App, engine_app, SessionLocal_Main
+from cache import SingleFlight, TTLCache
+from database import SessionLocal_App, engine_app, SessionLocal_Main, executor_app, executor_main, run_in_db_executor, MAIN_DB_MAX_CONCURRENCY, get_pool_metrics
 import main_system_queries
+import protheus_sync
+import jobs
+import face_store
+import face_verification
+import migrations
 from main_system_queries import (
     get_schedule_times_for_day,
     get_raw_punches_for_period
@@ -28,10 +47,25 @@ from main_system_queries import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tamanho do lote de funcionários calculado por thread no relatório mensal
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", "50"))
+# No modo streaming os lotes são menores, para que a primeira linha chegue logo ao navegador
+REPORT_STREAM_CHUNK_SIZE = int(os.getenv("REPORT_STREAM_CHUNK_SIZE", "10"))
+# Pedidos idênticos de relatório em andamento compartilham um único cálculo (e uma única carga no Protheus)
+monthly_report_flights = SingleFlight()
+# Quantidade máxima de registros aceitos por chamada de /punches/external/batch
+EXTERNAL_PUNCH_BATCH_LIMIT = int(os.getenv("EXTERNAL_PUNCH_BATCH_LIMIT", "10000"))
+# Linhas lidas por vez de um CSV de escala (planilhas .xlsx são lidas inteiras)
+SCHEDULE_IMPORT_CHUNK_SIZE = int(os.getenv("SCHEDULE_IMPORT_CHUNK_SIZE", "50000"))
+# Dias com pelo menos esta idade são gravados em daily_balances; os mais recentes ainda podem receber batidas
+DAILY_BALANCE_SETTLE_DAYS = int(os.getenv("DAILY_BALANCE_SETTLE_DAYS", "2"))
+
 br_holidays = holidays.Brazil(state='GO')
 br_holidays.update({"2025-01-21": "Aniversário de Goiatuba"})
 
 models.Base.metadata.create_all(bind=engine_app)
+# create_all não altera tabelas existentes; colunas novas em tabelas antigas vêm de migrations.py
+migrations.check_schema(engine_app)
 app = FastAPI()
 
 origins = ["*"]
@@ -50,12 +84,41 @@ def get_db_main():
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+# Arquivos com as linhas rejeitadas nas importações de escala, para download
+IMPORT_ERRORS_DIR = os.path.join(BASE_DIR, "import_errors")
+os.makedirs(IMPORT_ERRORS_DIR, exist_ok=True)
+os.makedirs(face_verification.FACE_PHOTOS_DIR, exist_ok=True)
+
+# --- RECONHECIMENTO FACIAL ---
+# O modelo é carregado no startup de cada worker; a verificação (CPU) roda neste pool, fora do event loop.
+FACE_VERIFY_MAX_CONCURRENCY = int(os.getenv("FACE_VERIFY_MAX_CONCURRENCY", "2"))
+executor_face = ThreadPoolExecutor(max_workers=FACE_VERIFY_MAX_CONCURRENCY, thread_name_prefix="face")
+face_verifier = face_verification.FaceVerifier(face_store.FaceEmbeddingStore(face_store.FACE_RECOGNITION_ENCODINGS_DIR, metric="euclidean"))
+
+@app.on_event("startup")
+def load_face_model():
+    try:
+        face_verifier.load()
+    except ImportError as e:
+        logger.warning(f"Reconhecimento facial desativado (dependência ausente): {e}")
 
 SECRET_KEY = "SUA_CHAVE_SECRETA_MUITO_FORTE_E_LONGA"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt consome 100-300 ms de CPU por senha (e libera o GIL). Hash e verificação rodam neste pool,
+# fora do event loop, e o tamanho dele limita quantos logins são processados ao mesmo tempo.
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", str(os.cpu_count() or 2)))
+executor_password = ThreadPoolExecutor(max_workers=PASSWORD_HASH_MAX_CONCURRENCY, thread_name_prefix="password")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Usuários já validados, por (username, versão do token), para não consultar o banco a cada requisição
+# autenticada. A troca de senha incrementa a versão no banco (tokens antigos passam a ser recusados) e limpa
+# as entradas do usuário neste processo; nos demais, o TTL limita quanto tempo a versão antiga ainda é aceita.
+# Usuários são removidos direto no banco: o token deles continua valendo por até AUTH_CACHE_TTL_SECONDS em cada
+# processo que já o tinha validado, a menos que /cache/auth/invalidate seja chamado para o usuário.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
+auth_user_cache = TTLCache(ttl_seconds=AUTH_CACHE_TTL_SECONDS, max_entries=AUTH_CACHE_MAX_ENTRIES)
 
 def verify_password(plain_password, hashed_password): return pwd_context.verify(plain_password, hashed_password)
 def get_password_hash(password): return pwd_context.hash(password)
@@ -64,16 +127,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+def _get_user_by_username(db: Session, username: str) -> Optional[models.AppUser]:
+    return db.query(models.AppUser).filter(models.AppUser.username == username).first()
+def invalidate_auth_cache(username: str) -> int:
+    return auth_user_cache.invalidate(lambda key: key[0] == username)
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db_app)):
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
+        token_version = payload.get("ver", 0)
         if username is None: raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.AppUser).filter(models.AppUser.username == username).first()
-    if user is None: raise credentials_exception
+    cache_key = (username, token_version)
+    user = auth_user_cache.get(cache_key)
+    if user is not None: return user
+    db_user = await run_in_db_executor(executor_app, _get_user_by_username, db, username)
+    if db_user is None or db_user.token_version != token_version: raise credentials_exception
+    # Cópia fora de sessão: o objeto é compartilhado entre requisições e não pode expirar com o commit de uma delas
+    user = models.AppUser(id=db_user.id, username=db_user.username, token_version=db_user.token_version)
+    auth_user_cache.set(cache_key, user)
     return user
 
 # --- LÓGICA DE CÁLCULO DE CICLO ---
@@ -86,12 +160,14 @@ def get_cycle_week(work_date: date, start_date: date, weeks_in_cycle: int) -> in
 
 # --- Pydantic Models ---
 class UserCreate(BaseModel): username: str; password: str
+class PasswordChange(BaseModel): current_password: str; new_password: str
 class Token(BaseModel): access_token: str; token_type: str
 class RelatorioRequest(BaseModel):
     matricula: str
     data_inicio: str
     data_fim: str
 class ExternalPunchRequest(BaseModel): employee_id: str; work_date: date; entry1: Optional[time] = None; exit1: Optional[time] = None; entry2: Optional[time] = None; exit2: Optional[time] = None
+class ExternalPunchBatchRequest(BaseModel): punches: List[ExternalPunchRequest]
 class CalculatedMinutes(BaseModel):
     normal: int
     overtime_50: int
@@ -114,15 +190,35 @@ class MonthlyReportRequest(BaseModel):
     year: int
     month: int
     cycle_start_date: date
-class ManualOverrideRequest(BaseModel):
-    employee_id: str
+class DailyBalanceInvalidationRequest(BaseModel):
+    employee_ids: Optional[List[str]] = None
+    start_date: date
+    end_date: date
+class DateRange(BaseModel):
     start_date: date
     end_date: date
+class ManualOverrideRequest(BaseModel):
+    # Um funcionário e um período, ou vários funcionários (employee_ids) e vários períodos (ranges)
+    employee_id: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    employee_ids: Optional[List[str]] = None
+    ranges: Optional[List[DateRange]] = None
     override_type: str
     description: Optional[str] = None
 
 # --- LÓGICA DE NEGÓCIO ---
 
+class PunchTimeline:
+    """Batidas de um funcionário ordenadas uma única vez, com busca por janela de horário em O(log n)."""
+
+    def __init__(self, punches: List[datetime]):
+        self._punches = sorted(punches)
+
+    def between(self, window_start: datetime, window_end: datetime) -> List[datetime]:
+        """Retorna, em ordem, as batidas dentro da janela [window_start, window_end] (limites inclusos)."""
+        return self._punches[bisect_left(self._punches, window_start):bisect_right(self._punches, window_end)]
+
 def _combine_punches(main_punches: Dict[str, Optional[time]], app_punches: Dict[str, Optional[time]]) -> Dict[str, Optional[time]]:
     return {
         key: app_punches.get(key) or main_punches.get(key)
@@ -137,6 +233,56 @@ def _calculate_minutes_from_punches(punches: List[datetime]) -> int:
         total_seconds += (end_dt - start_dt).total_seconds()
     return int(round(total_seconds / 60))
 
+def _load_records_by_employee_day(db: Session, model, employee_ids: List[str], start_date: date, end_date: date) -> Dict[tuple, Any]:
+    """Carrega em uma consulta os registros diários (únicos por funcionário e data) de um período, indexados por (employee_id, work_date)."""
+    records = db.query(model).filter(
+        model.employee_id.in_(employee_ids),
+        model.work_date >= start_date,
+        model.work_date <= end_date
+    ).all()
+    return {(record.employee_id, record.work_date): record for record in records}
+
+def _invalidate_daily_balances(db: Session, employee_days) -> int:
+    """Remove os saldos materializados dos pares (employee_id, work_date) informados. Não faz commit."""
+    pairs = list(set(employee_days))
+    deleted = 0
+    for i in range(0, len(pairs), 1000):
+        deleted += db.query(models.DailyBalance).filter(
+            tuple_(models.DailyBalance.employee_id, models.DailyBalance.work_date).in_(pairs[i:i + 1000])
+        ).delete(synchronize_session=False)
+    return deleted
+
+def _save_daily_balances(db: Session, balances: List[Dict[str, Any]]) -> None:
+    """
+    Grava os saldos calculados; se outro relatório já gravou o mesmo dia, mantém o existente.
+    Os saldos gravados são só um atalho para os próximos relatórios: em caso de erro a transação é desfeita e o
+    erro vai para o log (com o traceback), sem derrubar o relatório que já foi calculado e entregue.
+    """
+    try:
+        for i in range(0, len(balances), 1000):
+            db.execute(pg_insert(models.DailyBalance).values(balances[i:i + 1000]).on_conflict_do_nothing(constraint='_employee_balance_date_uc'))
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        logger.exception(f"Erro ao gravar {len(balances)} saldo(s) diário(s) materializado(s); serão recalculados no próximo relatório.")
+
+def _invalidate_shift_daily_balances(db_app: Session, db_main: Session, shift_code: Optional[str]) -> int:
+    """
+    Remove os saldos materializados calculados com o turno: os dos funcionários que têm o turno como padrão no
+    Protheus e os dos dias em que a escala do app (EscalaDiaria) usa o turno. Sem turno, remove todos. Não faz commit.
+    """
+    query = db_app.query(models.DailyBalance)
+    if shift_code:
+        code = shift_code.strip()
+        employee_ids = main_system_queries.get_employee_ids_by_shift(db_main, code)
+        scheduled_days = db_app.query(models.EscalaDiaria.id).filter(
+            models.EscalaDiaria.shift_code == code,
+            models.EscalaDiaria.employee_id == models.DailyBalance.employee_id,
+            models.EscalaDiaria.work_date == models.DailyBalance.work_date
+        ).exists()
+        query = query.filter(or_(models.DailyBalance.employee_id.in_(employee_ids), scheduled_days))
+    return query.delete(synchronize_session=False)
+
 def calculate_daily_balance(work_date: date, worked_minutes: int, planned_minutes: int, day_type: Optional[str]) -> Dict[str, int]:
     calculated = {"normal": 0, "overtime_50": 0, "overtime_100": 0, "undertime": 0}
     is_holiday_or_dsr = work_date in br_holidays or (day_type and day_type in ['D', 'C'])
@@ -163,27 +309,39 @@ def calculate_daily_balance(work_date: date, worked_minutes: int, planned_minute
 # --- ENDPOINTS ---
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db_app)):
-    user = db.query(models.AppUser).filter(models.AppUser.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await run_in_db_executor(executor_app, _get_user_by_username, db, form_data.username)
+    if not user or not await run_in_db_executor(executor_password, verify_password, form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password", headers={"WWW-Authenticate": "Bearer"})
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+    access_token = create_access_token(data={"sub": user.username, "ver": user.token_version}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/users/register")
 def register_user(user: UserCreate, db: Session = Depends(get_db_app)):
     if db.query(models.AppUser).filter(models.AppUser.username == user.username).first():
         raise HTTPException(status_code=400, detail="Username already registered")
-    new_user = models.AppUser(username=user.username, hashed_password=get_password_hash(user.password))
+    new_user = models.AppUser(username=user.username, hashed_password=executor_password.submit(get_password_hash, user.password).result())
     db.add(new_user); db.commit(); db.refresh(new_user)
     return {"status": "success", "username": new_user.username}
 
+@app.post("/users/me/password")
+def change_password(request: PasswordChange, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    user = _get_user_by_username(db, current_user.username)
+    if not user or not executor_password.submit(verify_password, request.current_password, user.hashed_password).result():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
+    user.hashed_password = executor_password.submit(get_password_hash, request.new_password).result()
+    # Revoga todos os tokens emitidos antes da troca; o usuário recebe um token novo na resposta
+    user.token_version = models.AppUser.token_version + 1
+    db.commit(); db.refresh(user)
+    invalidate_auth_cache(user.username)
+    access_token = create_access_token(data={"sub": user.username, "ver": user.token_version}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return {"status": "success", "username": user.username, "access_token": access_token, "token_type": "bearer"}
+
 @app.get("/employees/main")
 def get_all_employees(db: Session = Depends(get_db_main), current_user: models.AppUser = Depends(get_current_user)):
     return {"status": "success", "employees": main_system_queries.get_all_employees_from_main_system(db)}
 
-@app.post("/get-relatorio-funcionario")
-async def get_relatorio_funcionario_endpoint(data: RelatorioRequest, db: Session = Depends(get_db_main)):
+def _build_relatorio_funcionario(data: RelatorioRequest, db: Session) -> Dict[str, Any]:
     try:
         matricula = data.matricula
         data_inicio = datetime.strptime(data.data_inicio, "%Y-%m-%d").date()
@@ -195,7 +353,7 @@ async def get_relatorio_funcionario_endpoint(data: RelatorioRequest, db: Session
         shift_details = main_system_queries.get_shift_info(db, turno)
         weeks_in_cycle = shift_details.get("weeks_in_cycle", 1)
         start_date_protheus = date(1980, 1, 6)
-        all_punches = get_raw_punches_for_period(db, matricula, data_inicio - timedelta(days=1), data_fim + timedelta(days=1))
+        punch_timeline = PunchTimeline(get_raw_punches_for_period(db, matricula, data_inicio - timedelta(days=1), data_fim + timedelta(days=1)))
         dias_relatorio = []
         data_atual = data_inicio
         while data_atual <= data_fim:
@@ -219,7 +377,7 @@ async def get_relatorio_funcionario_endpoint(data: RelatorioRequest, db: Session
                     if shift_end_dt < shift_start_dt: shift_end_dt += timedelta(days=1)
                     search_window_start = shift_start_dt - timedelta(hours=2)
                     search_window_end = shift_end_dt + timedelta(hours=4)
-                    punches_for_this_shift = sorted([p for p in all_punches if search_window_start <= p <= search_window_end])
+                    punches_for_this_shift = punch_timeline.between(search_window_start, search_window_end)
                     if punches_for_this_shift:
                         worked_minutes = _calculate_minutes_from_punches(punches_for_this_shift)
                         horas_trabalhadas_str = f"{worked_minutes // 60:02d}:{worked_minutes % 60:02d}"
@@ -242,31 +400,59 @@ async def get_relatorio_funcionario_endpoint(data: RelatorioRequest, db: Session
         logger.error(f"Erro ao gerar relatório para {data.matricula}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro interno ao gerar relatório: {str(e)}")
 
-@app.post("/report/monthly", response_model=List[DetailedReportData])
-def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Session = Depends(get_db_app), db_main: Session = Depends(get_db_main), current_user: models.AppUser = Depends(get_current_user)):
-    report_data = []
-    all_employees_map = {emp['employee_id']: emp['name'] for emp in main_system_queries.get_all_employees_from_main_system(db_main)}
+@app.post("/get-relatorio-funcionario")
+async def get_relatorio_funcionario_endpoint(data: RelatorioRequest, db: Session = Depends(get_db_main)):
+    return await run_in_db_executor(executor_main, _build_relatorio_funcionario, data, db)
+
+def _iter_monthly_report(request: MonthlyReportRequest, employee_ids: List[str], employee_names: Dict[str, str], db_app: Session, db_main: Session):
+    """Calcula o relatório mensal dos funcionários informados, entregando um DetailedReportData por vez."""
     start_date = date(request.year, request.month, 1)
     _, num_days_in_month = calendar.monthrange(request.year, request.month)
     end_date = date(request.year, request.month, num_days_in_month)
+
+    # Carrega de uma só vez os ajustes, escalas e batidas do app de todos os funcionários no mês
+    overrides_by_day = _load_records_by_employee_day(db_app, models.ManualOverride, employee_ids, start_date, end_date)
+    schedules_by_day = _load_records_by_employee_day(db_app, models.EscalaDiaria, employee_ids, start_date, end_date)
+    app_punches_by_employee = defaultdict(dict)
+    for (punch_emp_id, work_date), p in _load_records_by_employee_day(db_app, models.ExternalPunch, employee_ids, start_date, end_date).items():
+        app_punches_by_employee[punch_emp_id][work_date] = {"entry1": p.entry1, "exit1": p.exit1, "entry2": p.entry2, "exit2": p.exit2}
+
+    # Saldos já materializados: funcionários com o mês inteiro gravado não precisam das batidas do Protheus
+    stored_balances = {
+        (b.employee_id, b.work_date): b for b in db_app.query(models.DailyBalance).filter(
+            models.DailyBalance.employee_id.in_(employee_ids),
+            models.DailyBalance.work_date >= start_date,
+            models.DailyBalance.work_date <= end_date,
+            models.DailyBalance.cycle_start_date == request.cycle_start_date
+        ).all()
+    }
+    pending_employee_ids = [
+        emp_id for emp_id in employee_ids
+        if any((emp_id, date(request.year, request.month, day)) not in stored_balances for day in range(1, num_days_in_month + 1))
+    ]
+    last_settled_date = date.today() - timedelta(days=DAILY_BALANCE_SETTLE_DAYS)
+    new_balances = []
+
+    # Carrega de uma só vez a escala (SPJ010) de todos os turnos envolvidos no relatório
+    default_shift_codes = {emp_id: main_system_queries.get_employee_shift_code(db_main, emp_id) for emp_id in employee_ids}
+    shift_calendar = main_system_queries.load_shift_calendar(
+        db_main, list(default_shift_codes.values()) + [escala.shift_code for escala in schedules_by_day.values()]
+    )
+    main_system_punches_by_employee = main_system_queries.get_raw_punches_for_employees(
+        db_main, pending_employee_ids, start_date - timedelta(days=1), end_date + timedelta(days=1)
+    )
     
-    for emp_id in request.employee_ids:
-        default_shift_code = main_system_queries.get_employee_shift_code(db_main, emp_id)
+    for emp_id in employee_ids:
+        default_shift_code = default_shift_codes.get(emp_id)
         if not default_shift_code:
             logger.warning(f"Pulando funcionário {emp_id}: turno padrão não encontrado.")
             continue
-        default_shift_info = main_system_queries.get_shift_info(db_main, default_shift_code)
+        default_shift_info = shift_calendar.get_shift_info(default_shift_code)
         is_overnight_shift = default_shift_info.get("planned_start_time") and default_shift_info["planned_start_time"].hour >= 18
         
-        main_system_punches_list = get_raw_punches_for_period(db_main, emp_id, start_date - timedelta(days=1), end_date + timedelta(days=1))
-        
-        app_punches_db = db_app.query(models.ExternalPunch).filter(
-            models.ExternalPunch.employee_id == emp_id,
-            models.ExternalPunch.work_date >= start_date,
-            models.ExternalPunch.work_date <= end_date
-        ).all()
+        punch_timeline = PunchTimeline(main_system_punches_by_employee.get(emp_id, []))
         
-        app_punches_map = {p.work_date: {"entry1": p.entry1, "exit1": p.exit1, "entry2": p.entry2, "exit2": p.exit2} for p in app_punches_db}
+        app_punches_map = app_punches_by_employee.get(emp_id, {})
 
         daily_breakdown_list = []
         totals_in_minutes = {"normal": 0, "overtime_50": 0, "overtime_100": 0, "undertime": 0}
@@ -284,15 +470,22 @@ def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Sess
             day_type = None # Inicia como None para garantir que seja definido
             status = None
             
-            manual_override = db_app.query(models.ManualOverride).filter_by(employee_id=emp_id, work_date=current_date).first()
-            if manual_override:
+            manual_override = overrides_by_day.get((emp_id, current_date))
+            stored_balance = stored_balances.get((emp_id, current_date))
+            if stored_balance:
+                status = stored_balance.status
+                calculated_minutes = {key: getattr(stored_balance, key) for key in ["normal", "overtime_50", "overtime_100", "undertime"]}
+                main_punches_for_day = {
+                    key: getattr(stored_balance, key) for key in ["entry1", "exit1", "entry2", "exit2"] if getattr(stored_balance, key)
+                }
+            elif manual_override:
                 status = manual_override.override_type
                 calculated_minutes = {"normal": 0, "overtime_50": 0, "overtime_100": 0, "undertime": 0}
                 main_punches_for_day = {}
             else:
                 # --- LÓGICA DE PRIORIDADE CORRIGIDA ---
                 # 1. Checa a planilha de escala primeiro
-                daily_schedule_app = db_app.query(models.EscalaDiaria).filter_by(employee_id=emp_id, work_date=current_date).first()
+                daily_schedule_app = schedules_by_day.get((emp_id, current_date))
                 if daily_schedule_app:
                     if daily_schedule_app.day_type == 'FOLGA':
                         day_type = 'D'
@@ -300,17 +493,17 @@ def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Sess
                     else: # É 'TRABALHO' na planilha
                         day_type = 'S' # Força a ser um dia de trabalho
                         shift_code = daily_schedule_app.shift_code or default_shift_code
-                        planned_minutes = main_system_queries.get_standard_shift_minutes(db_main, shift_code)
+                        planned_minutes = shift_calendar.get_standard_shift_minutes(shift_code)
                 else: 
                     # 2. Se não está na planilha, usa a escala padrão do Protheus
-                    schedule_info = main_system_queries.get_work_schedule_info_for_day(db_main, default_shift_code, filial, cycle_week, day_of_week_protheus)
+                    schedule_info = shift_calendar.get_work_schedule_info_for_day(default_shift_code, filial, cycle_week, day_of_week_protheus)
                     planned_minutes = schedule_info.get('minutes', 0)
                     day_type = schedule_info.get('type', 'S')
 
                 # 3. Busca as batidas apenas se o dia for definido como de trabalho
                 main_punches_for_day = {}
                 if day_type not in ['F', 'D', 'C']:
-                    schedule_times = get_schedule_times_for_day(db_main, default_shift_code, filial, cycle_week, day_of_week_protheus)
+                    schedule_times = shift_calendar.get_schedule_times_for_day(default_shift_code, filial, cycle_week, day_of_week_protheus)
                     if schedule_times.get("start"):
                         start_time = schedule_times["start"]
                         end_time = schedule_times.get("end") or time(23, 59)
@@ -321,7 +514,7 @@ def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Sess
                         search_window_start = shift_start_dt - timedelta(hours=2)
                         search_window_end = shift_end_dt + timedelta(hours=4)
                         
-                        punches_for_this_shift = sorted([p for p in main_system_punches_list if search_window_start <= p <= search_window_end])
+                        punches_for_this_shift = punch_timeline.between(search_window_start, search_window_end)
                         
                         if punches_for_this_shift:
                             if len(punches_for_this_shift) >= 1: main_punches_for_day["entry1"] = punches_for_this_shift[0].time()
@@ -349,6 +542,13 @@ def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Sess
                 
                 worked_minutes = _calculate_minutes_from_punches(temp_punches)
                 calculated_minutes = calculate_daily_balance(current_date, worked_minutes, planned_minutes, day_type)
+
+            if not stored_balance and current_date <= last_settled_date:
+                new_balances.append({
+                    "employee_id": emp_id, "work_date": current_date, "cycle_start_date": request.cycle_start_date,
+                    **{key: main_punches_for_day.get(key) for key in ["entry1", "exit1", "entry2", "exit2"]},
+                    **calculated_minutes, "status": status
+                })
             
             daily_breakdown_list.append(DailyBreakdown(
                 date=current_date,
@@ -359,14 +559,102 @@ def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Sess
             ))
             for key in totals_in_minutes: totals_in_minutes[key] += calculated_minutes.get(key, 0)
 
-        report_data.append(DetailedReportData(
+        yield DetailedReportData(
             employee_id=emp_id,
-            employee_name=all_employees_map.get(emp_id, "Nome não encontrado"),
+            employee_name=employee_names.get(emp_id, "Nome não encontrado"),
             shift_description=f"{default_shift_info['description']} ({'Noturno' if is_overnight_shift else 'Diurno'})",
             daily_breakdown=daily_breakdown_list,
             totals_in_minutes=totals_in_minutes
-        ))
-    return report_data
+        )
+    if new_balances:
+        _save_daily_balances(db_app, new_balances)
+
+def _build_monthly_report(request: MonthlyReportRequest, employee_ids: List[str], employee_names: Dict[str, str], db_app: Session, db_main: Session) -> List[DetailedReportData]:
+    return list(_iter_monthly_report(request, employee_ids, employee_names, db_app, db_main))
+
+def _monthly_report_key(request: MonthlyReportRequest, employee_ids: List[str]) -> tuple:
+    return ("monthly", tuple(employee_ids), request.year, request.month, request.cycle_start_date)
+
+def _get_employee_names(db_main: Session) -> Dict[str, str]:
+    """Mapa matrícula -> nome do Protheus; consultas simultâneas compartilham a mesma leitura."""
+    employees = monthly_report_flights.do(("employees",), lambda: main_system_queries.get_all_employees_from_main_system(db_main))
+    return {emp['employee_id']: emp['name'] for emp in employees}
+
+def _build_monthly_report_chunk(request: MonthlyReportRequest, employee_ids: List[str], employee_names: Dict[str, str]) -> List[DetailedReportData]:
+    """
+    Calcula um lote de funcionários com sessões próprias, para rodar em uma thread do pool do Protheus.
+    Se o mesmo lote do mesmo período já estiver sendo calculado por outro pedido, aguarda e reaproveita o resultado.
+    """
+    def compute():
+        db_app = SessionLocal_App()
+        db_main = SessionLocal_Main()
+        try:
+            return _build_monthly_report(request, employee_ids, employee_names, db_app, db_main)
+        finally:
+            db_app.close()
+            db_main.close()
+
+    return monthly_report_flights.do(_monthly_report_key(request, employee_ids), compute)
+
+def _iter_monthly_report_chunks(request: MonthlyReportRequest, employee_names: Dict[str, str], chunk_size: int):
+    """
+    Divide os funcionários em lotes calculados em paralelo no pool do Protheus e entrega o resultado de cada
+    lote na ordem do pedido. No máximo MAIN_DB_MAX_CONCURRENCY lotes ficam em andamento (ou prontos e
+    aguardando consumo) ao mesmo tempo.
+    """
+    employee_ids = request.employee_ids
+    chunks = iter([employee_ids[i:i + chunk_size] for i in range(0, len(employee_ids), chunk_size)])
+    logger.info(f"Relatório mensal de {len(employee_ids)} funcionários dividido em lotes de até {chunk_size}.")
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor_main.submit(_build_monthly_report_chunk, request, chunk, employee_names))
+        if len(pending) >= MAIN_DB_MAX_CONCURRENCY:
+            break
+    while pending:
+        chunk_report = pending.popleft().result()
+        next_chunk = next(chunks, None)
+        if next_chunk is not None:
+            pending.append(executor_main.submit(_build_monthly_report_chunk, request, next_chunk, employee_names))
+        yield chunk_report
+
+@app.post("/report/monthly", response_model=List[DetailedReportData])
+def generate_detailed_monthly_report(request: MonthlyReportRequest, db_app: Session = Depends(get_db_app), db_main: Session = Depends(get_db_main), current_user: models.AppUser = Depends(get_current_user)):
+    def compute():
+        all_employees_map = _get_employee_names(db_main)
+        if len(request.employee_ids) <= REPORT_CHUNK_SIZE:
+            return _build_monthly_report(request, request.employee_ids, all_employees_map, db_app, db_main)
+        report_data = []
+        for chunk_report in _iter_monthly_report_chunks(request, all_employees_map, REPORT_CHUNK_SIZE):
+            report_data.extend(chunk_report)
+        return report_data
+
+    # Quem pedir o mesmo relatório enquanto ele é calculado recebe o mesmo resultado, sem novo cálculo
+    return monthly_report_flights.do(_monthly_report_key(request, request.employee_ids), compute)
+
+@app.post("/report/monthly/stream")
+def stream_detailed_monthly_report(request: MonthlyReportRequest, db_main: Session = Depends(get_db_main), current_user: models.AppUser = Depends(get_current_user)):
+    """
+    Mesmo conteúdo de /report/monthly em NDJSON: um DetailedReportData por linha, enviado assim que o lote
+    do funcionário termina. Os lotes usam sessões próprias, pois a resposta continua após o fim do endpoint.
+    A última linha indica como o relatório terminou: {"done": true, "employees": n} ou, se um erro ocorrer depois
+    que o envio começou (o status 200 já foi enviado), {"error": "..."}. Sem essa linha, o relatório está incompleto.
+    """
+    all_employees_map = _get_employee_names(db_main)
+
+    def generate_lines():
+        sent = 0
+        try:
+            for chunk_report in _iter_monthly_report_chunks(request, all_employees_map, REPORT_STREAM_CHUNK_SIZE):
+                for employee_report in chunk_report:
+                    yield employee_report.json() + "\n"
+                    sent += 1
+        except Exception as e:
+            logger.error(f"Erro no relatório mensal em NDJSON após {sent} funcionário(s): {e}", exc_info=True)
+            yield json.dumps({"error": f"Erro interno ao gerar o relatório: {e}", "employees": sent}) + "\n"
+            return
+        yield json.dumps({"done": True, "employees": sent}) + "\n"
+
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
 
 
 # --- OUTROS ENDPOINTS (O RESTO DO SEU CÓDIGO) ---
@@ -378,91 +666,460 @@ def receive_external_punches(request: ExternalPunchRequest, db: Session = Depend
         existing_punch.status = "pending"; message = "Registro de ponto externo atualizado."
     else:
         existing_punch = models.ExternalPunch(**request.dict()); db.add(existing_punch); message = "Registro de ponto externo criado."
+    _invalidate_daily_balances(db, [(request.employee_id, request.work_date)])
     db.commit(); db.refresh(existing_punch)
     return {"status": "success", "message": message, "data": existing_punch}
 
+@app.post("/punches/external/batch")
+def receive_external_punches_batch(request: ExternalPunchBatchRequest, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    """
+    Recebe muitos registros de ponto externo de uma vez e grava tudo com INSERT ... ON CONFLICT
+    (employee_id, work_date) DO UPDATE, em uma única transação. Retorna o resultado de cada linha enviada:
+    'created', 'updated' ou 'superseded' (quando uma linha posterior do mesmo lote tem o mesmo funcionário e data).
+    """
+    if len(request.punches) > EXTERNAL_PUNCH_BATCH_LIMIT:
+        raise HTTPException(status_code=413, detail=f"O lote aceita no máximo {EXTERNAL_PUNCH_BATCH_LIMIT} registros.")
+
+    # Dentro de um mesmo INSERT o PostgreSQL não permite atualizar a mesma linha duas vezes: vale a última ocorrência
+    last_index_by_key = {(punch.employee_id, punch.work_date): index for index, punch in enumerate(request.punches)}
+    rows = [{**request.punches[index].dict(), "status": "pending"} for index in last_index_by_key.values()]
+
+    outcome_by_key = {}
+    for i in range(0, len(rows), 1000):
+        stmt = pg_insert(models.ExternalPunch).values(rows[i:i + 1000])
+        stmt = stmt.on_conflict_do_update(
+            constraint='_employee_punch_date_uc',
+            set_={col: stmt.excluded[col] for col in ["entry1", "exit1", "entry2", "exit2", "status"]}
+        ).returning(
+            models.ExternalPunch.employee_id, models.ExternalPunch.work_date,
+            literal_column("(xmax = 0)").label("inserted") # xmax = 0 indica linha recém-inserida
+        )
+        for row in db.execute(stmt):
+            outcome_by_key[(row.employee_id, row.work_date)] = "created" if row.inserted else "updated"
+    _invalidate_daily_balances(db, last_index_by_key.keys())
+    db.commit()
+
+    results = []
+    for index, punch in enumerate(request.punches):
+        key = (punch.employee_id, punch.work_date)
+        outcome = outcome_by_key[key] if last_index_by_key[key] == index else "superseded"
+        results.append({"index": index, "employee_id": punch.employee_id, "work_date": punch.work_date, "outcome": outcome})
+    created = sum(1 for outcome in outcome_by_key.values() if outcome == "created")
+    return {
+        "status": "success",
+        "message": f"{created} registro(s) criado(s), {len(outcome_by_key) - created} atualizado(s).",
+        "results": results
+    }
+
 @app.get("/punches/external/{employee_id}/{work_date}")
 def get_external_punches_for_day(employee_id: str, work_date: date, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
     punches = db.query(models.ExternalPunch).filter_by(employee_id=employee_id, work_date=work_date).first()
     if not punches: raise HTTPException(status_code=404, detail="Nenhum registro de ponto externo encontrado para esta data.")
     return punches
 
+PUNCH_SLOTS = ("entry1", "exit1", "entry2", "exit2")
+
+def _record_face_punch(db: Session, employee_id: str, punch_datetime: datetime, photo_bytes: bytes, extension: str,
+                       result: Dict[str, Any], created_by: str) -> Dict[str, Any]:
+    """
+    Grava a foto em fotos_batidas/ e o resultado da verificação. Se o rosto conferir, a batida ocupa o próximo
+    horário vazio (entry1, exit1, entry2, exit2) do ExternalPunch do dia. A linha do dia é criada com
+    ON CONFLICT DO NOTHING e lida com FOR UPDATE, para que batidas simultâneas da mesma matrícula esperem uma
+    pela outra em vez de disputarem o mesmo horário ou a restrição única.
+    """
+    photo_name = f"{employee_id}_{punch_datetime:%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}{extension}"
+    with open(os.path.join(face_verification.FACE_PHOTOS_DIR, photo_name), "wb") as photo_file:
+        photo_file.write(photo_bytes)
+    external_punch, slot = None, None
+    if result["verified"]:
+        work_date = punch_datetime.date()
+        db.execute(pg_insert(models.ExternalPunch).values(employee_id=employee_id, work_date=work_date, status="pending")
+                   .on_conflict_do_nothing(constraint='_employee_punch_date_uc'))
+        external_punch = db.query(models.ExternalPunch).filter_by(employee_id=employee_id, work_date=work_date).with_for_update().one()
+        slot = next((name for name in PUNCH_SLOTS if getattr(external_punch, name) is None), None)
+        if slot:
+            setattr(external_punch, slot, punch_datetime.time().replace(microsecond=0))
+            external_punch.status = "pending"
+            _invalidate_daily_balances(db, [(employee_id, work_date)])
+        db.flush()
+    verification = models.FacePunchVerification(
+        employee_id=employee_id, punch_datetime=punch_datetime, photo_path=photo_name,
+        verified=result["verified"], distance=result["distance"], tolerance=result["tolerance"],
+        model_name=result["model_name"], elapsed_ms=result["elapsed_ms"],
+        external_punch_id=external_punch.id if external_punch else None, punch_slot=slot,
+        created_by=created_by, created_at=datetime.utcnow()
+    )
+    db.add(verification); db.commit()
+    return {
+        "verification_id": verification.id, "employee_id": employee_id, "punch_datetime": punch_datetime,
+        "verified": result["verified"], "distance": result["distance"], "tolerance": result["tolerance"],
+        "elapsed_ms": round(result["elapsed_ms"], 1), "punch_slot": slot,
+        "external_punch_id": verification.external_punch_id, "photo": photo_name
+    }
+
+@app.post("/punches/face", status_code=201)
+async def receive_face_punch(employee_id: str = Form(...), photo: UploadFile = File(...), punch_datetime: Optional[datetime] = Form(None),
+                             db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    """Batida com foto: verifica o rosto contra o cadastro da matrícula e, se conferir, registra o horário no ponto externo."""
+    if not face_verifier.loaded:
+        raise HTTPException(status_code=503, detail="Reconhecimento facial indisponível neste servidor.")
+    extension = os.path.splitext(photo.filename or "")[1].lower() or ".jpg"
+    if extension not in (".jpg", ".jpeg", ".png"):
+        raise HTTPException(status_code=400, detail="Formato de foto inválido. Envie um .jpg ou .png")
+    photo_bytes = await photo.read()
+    try:
+        result = await run_in_db_executor(executor_face, face_verifier.verify, employee_id, photo_bytes)
+    except face_verification.FaceVerificationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response = await run_in_db_executor(executor_app, _record_face_punch, db, employee_id, punch_datetime or datetime.now(),
+                                        photo_bytes, extension, result, current_user.username)
+    if not result["verified"]:
+        raise HTTPException(status_code=403, detail={"message": "O rosto não confere com o cadastro da matrícula.", **jsonable_encoder(response)})
+    if not response["punch_slot"]:
+        response["message"] = "Rosto verificado, mas os quatro horários do dia já estão preenchidos."
+    return {"status": "success", "data": response}
+
+def _override_targets(request: ManualOverrideRequest) -> Dict[str, list]:
+    """Junta os funcionários e períodos do pedido nos arrays usados pelas consultas em lote de /overrides."""
+    employee_ids = list(dict.fromkeys((request.employee_ids or []) + ([request.employee_id] if request.employee_id else [])))
+    ranges = list(request.ranges or [])
+    if request.start_date and request.end_date:
+        ranges.append(DateRange(start_date=request.start_date, end_date=request.end_date))
+    if not employee_ids or not ranges:
+        raise HTTPException(status_code=400, detail="Informe ao menos um funcionário e um período.")
+    if any(r.start_date > r.end_date for r in ranges):
+        raise HTTPException(status_code=400, detail="A data de início não pode ser posterior à data de fim.")
+    return {
+        "employee_ids": employee_ids,
+        "start_dates": [r.start_date for r in ranges],
+        "end_dates": [r.end_date for r in ranges],
+    }
+
+# Funcionários x períodos expandidos em dias pelo próprio PostgreSQL (generate_series)
+OVERRIDE_TARGET_DAYS_SQL = """
+    SELECT DISTINCT e.employee_id, CAST(d AS date) AS work_date
+    FROM unnest(CAST(:employee_ids AS varchar[])) AS e(employee_id)
+    CROSS JOIN unnest(CAST(:start_dates AS date[]), CAST(:end_dates AS date[])) AS r(start_date, end_date)
+    CROSS JOIN LATERAL generate_series(r.start_date, r.end_date, interval '1 day') AS d
+"""
+
 @app.post("/overrides", status_code=201)
 def create_or_update_override_range(request: ManualOverrideRequest, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
-    if request.start_date > request.end_date:
-        raise HTTPException(status_code=400, detail="A data de início não pode ser posterior à data de fim.")
-    days_to_process = (request.end_date - request.start_date).days + 1
-    count = 0
-    for i in range(days_to_process):
-        current_date = request.start_date + timedelta(days=i)
-        existing = db.query(models.ManualOverride).filter_by(employee_id=request.employee_id, work_date=current_date).first()
-        if existing:
-            existing.override_type = request.override_type
-            existing.description = request.description
-        else:
-            new_override = models.ManualOverride(employee_id=request.employee_id, work_date=current_date, override_type=request.override_type, description=request.description)
-            db.add(new_override)
-        count += 1
+    targets = _override_targets(request)
+    # Uma única instrução: grava todos os dias e descarta os saldos materializados desses dias
+    result = db.execute(text(f"""
+        WITH alvo AS ({OVERRIDE_TARGET_DAYS_SQL}),
+        saldos_removidos AS (
+            DELETE FROM daily_balances b USING alvo
+            WHERE b.employee_id = alvo.employee_id AND b.work_date = alvo.work_date
+        )
+        INSERT INTO manual_overrides (employee_id, work_date, override_type, description)
+        SELECT employee_id, work_date, :override_type, :description FROM alvo
+        ON CONFLICT ON CONSTRAINT _employee_override_date_uc
+        DO UPDATE SET override_type = EXCLUDED.override_type, description = EXCLUDED.description
+    """), {**targets, "override_type": request.override_type, "description": request.description})
+    count = result.rowcount
     db.commit()
     return {"status": "success", "message": f"{count} dia(s) de '{request.override_type}' foram aplicados com sucesso."}
 
 @app.delete("/overrides", status_code=200)
 def delete_override_range(request: ManualOverrideRequest, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
-    if request.start_date > request.end_date:
-        raise HTTPException(status_code=400, detail="A data de início não pode ser posterior à data de fim.")
-    overrides_to_delete = db.query(models.ManualOverride).filter(
-        models.ManualOverride.employee_id == request.employee_id,
-        models.ManualOverride.work_date >= request.start_date,
-        models.ManualOverride.work_date <= request.end_date
-    ).all()
-    if not overrides_to_delete:
+    targets = _override_targets(request)
+    count = db.execute(text("""
+        WITH removidos AS (
+            DELETE FROM manual_overrides mo
+            USING unnest(CAST(:employee_ids AS varchar[])) AS e(employee_id)
+            CROSS JOIN unnest(CAST(:start_dates AS date[]), CAST(:end_dates AS date[])) AS r(start_date, end_date)
+            WHERE mo.employee_id = e.employee_id AND mo.work_date BETWEEN r.start_date AND r.end_date
+            RETURNING mo.employee_id, mo.work_date
+        ),
+        saldos_removidos AS (
+            DELETE FROM daily_balances b USING removidos
+            WHERE b.employee_id = removidos.employee_id AND b.work_date = removidos.work_date
+        )
+        SELECT COUNT(*) FROM removidos
+    """), targets).scalar()
+    if not count:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Nenhum ajuste manual encontrado para este período.")
-    count = len(overrides_to_delete)
-    for override in overrides_to_delete:
-        db.delete(override)
     db.commit()
     return {"status": "success", "message": f"{count} ajuste(s) manual(is) foram removidos com sucesso."}
 
-@app.post("/schedules/upload")
-async def upload_schedule_file(db: Session = Depends(get_db_app), file: UploadFile = File(...), current_user: models.AppUser = Depends(get_current_user)):
-    if not file.filename.endswith(('.csv', '.xlsx')):
-        raise HTTPException(status_code=400, detail="Formato de arquivo inválido. Por favor, envie um .csv ou .xlsx")
+SCHEDULE_COLUMNS = ['employee_id', 'work_date', 'day_type', 'shift_code']
+
+def _read_schedule_chunks(filename: str, fileobj):
+    dtype = {'employee_id': str, 'shift_code': str}
+    if filename.endswith('.csv'):
+        yield from pd.read_csv(fileobj, dtype=dtype, chunksize=SCHEDULE_IMPORT_CHUNK_SIZE)
+    else:
+        yield pd.read_excel(fileobj, dtype=dtype)
+
+def _normalize_schedule_chunk(df: pd.DataFrame):
+    """
+    Valida e normaliza um bloco da planilha de escala com operações vetorizadas.
+    Retorna (linhas válidas prontas para o COPY, linhas rejeitadas com número da linha e motivo).
+    """
+    # pandas >= 2 deduz um único formato pela primeira data; 'mixed' interpreta cada valor, como a leitura linha a linha
+    date_options = {"format": "mixed"} if int(pd.__version__.split('.')[0]) >= 2 else {}
+    row_numbers = df.index + 2 # Linha 1 é o cabeçalho
+    employee_id = df['employee_id'].astype(str).str.strip().str.zfill(10)
+    work_date = pd.to_datetime(df['work_date'], errors='coerce', **date_options)
+    day_type = df['day_type'].astype(str).str.upper()
+    # Só os turnos preenchidos passam pelo .str: num bloco só de FOLGA a coluna inteira é nula e o pandas >= 3
+    # recusa o acessor .str no resultado do split
+    shift_code = df['shift_code'].astype(object).where(df['shift_code'].notna(), None)
+    has_shift = shift_code.notna()
+    shift_code[has_shift] = shift_code[has_shift].astype(str).str.strip().str.split('.').str[0].str.zfill(3)
+
+    reason = np.select(
+        [df['employee_id'].isna(), work_date.isna(), ~day_type.isin(['TRABALHO', 'FOLGA'])],
+        ["employee_id vazio", "work_date inválida", "day_type deve ser TRABALHO ou FOLGA"],
+        default=""
+    )
+    valid = reason == ""
+    valid_rows = pd.DataFrame({
+        "linha": row_numbers[valid],
+        "employee_id": employee_id[valid].values,
+        "work_date": work_date[valid].dt.date.values,
+        "day_type": day_type[valid].values,
+        "shift_code": shift_code[valid].values,
+    })
+    error_rows = pd.DataFrame({"linha": row_numbers[~valid], "motivo": reason[~valid]})
+    for col in SCHEDULE_COLUMNS:
+        error_rows[col] = df[col][~valid].values
+    return valid_rows, error_rows
+
+def _import_schedule_file(db: Session, filename: str, fileobj, on_chunk: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """
+    Importa a planilha de escala: valida em blocos vetorizados, carrega as linhas válidas com COPY numa tabela
+    temporária e grava tudo em escalas_diarias com um único upsert (a última linha do arquivo para o mesmo dia vence).
+    """
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file.file, dtype={'employee_id': str, 'shift_code': str})
-        else:
-            df = pd.read_excel(file.file, dtype={'employee_id': str, 'shift_code': str})
-
-        required_columns = ['employee_id', 'work_date', 'day_type', 'shift_code']
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(status_code=400, detail=f"O arquivo deve conter as colunas: {required_columns}")
-
-        success_count, error_count = 0, 0
-        for _, row in df.iterrows():
-            try:
-                employee_id = str(row['employee_id']).strip().zfill(10)
-                work_date = pd.to_datetime(row['work_date']).date()
-                day_type = str(row['day_type']).upper()
-                shift_code = str(row['shift_code']).strip().split('.')[0].zfill(3) if pd.notna(row['shift_code']) else None
-
-                if day_type not in ['TRABALHO', 'FOLGA']:
-                    error_count += 1
-                    continue
-                existing_schedule = db.query(models.EscalaDiaria).filter_by(employee_id=employee_id, work_date=work_date).first()
-                if existing_schedule:
-                    existing_schedule.day_type = day_type
-                    existing_schedule.shift_code = shift_code
-                else:
-                    new_schedule = models.EscalaDiaria(employee_id=employee_id, work_date=work_date, day_type=day_type, shift_code=shift_code)
-                    db.add(new_schedule)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Erro ao processar linha da escala: {row}. Erro: {e}")
-                error_count += 1
+        db.execute(text("""
+            CREATE TEMP TABLE escalas_staging (
+                linha integer, employee_id varchar, work_date date, day_type varchar, shift_code varchar
+            ) ON COMMIT DROP
+        """))
+        cursor = db.connection().connection.cursor()
+        success_count = 0
+        error_frames = []
+        rows_read = 0
+        for chunk in _read_schedule_chunks(filename, fileobj):
+            if not all(col in chunk.columns for col in SCHEDULE_COLUMNS):
+                raise HTTPException(status_code=400, detail=f"O arquivo deve conter as colunas: {SCHEDULE_COLUMNS}")
+            valid_rows, error_rows = _normalize_schedule_chunk(chunk)
+            rows_read += len(chunk)
+            if on_chunk:
+                on_chunk(rows_read)
+            if not error_rows.empty:
+                error_frames.append(error_rows)
+            if valid_rows.empty:
+                continue
+            buffer = io.StringIO()
+            valid_rows.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert("COPY escalas_staging (linha, employee_id, work_date, day_type, shift_code) FROM STDIN WITH (FORMAT csv)", buffer)
+            success_count += len(valid_rows)
+
+        db.execute(text("""
+            WITH alvo AS (
+                SELECT DISTINCT ON (employee_id, work_date) employee_id, work_date, day_type, shift_code
+                FROM escalas_staging
+                ORDER BY employee_id, work_date, linha DESC
+            ),
+            saldos_removidos AS (
+                DELETE FROM daily_balances b USING alvo
+                WHERE b.employee_id = alvo.employee_id AND b.work_date = alvo.work_date
+            )
+            INSERT INTO escalas_diarias (employee_id, work_date, day_type, shift_code)
+            SELECT employee_id, work_date, day_type, shift_code FROM alvo
+            ON CONFLICT ON CONSTRAINT _employee_schedule_date_uc
+            DO UPDATE SET day_type = EXCLUDED.day_type, shift_code = EXCLUDED.shift_code
+        """))
         db.commit()
         db.expire_all()
-        return {"status": "success", "message": f"Arquivo processado. {success_count} escalas salvas, {error_count} linhas com erro."}
+
+        error_count = sum(len(frame) for frame in error_frames)
+        response = {"status": "success", "message": f"Arquivo processado. {success_count} escalas salvas, {error_count} linhas com erro."}
+        if error_frames:
+            error_file_id = uuid.uuid4().hex
+            pd.concat(error_frames).to_csv(os.path.join(IMPORT_ERRORS_DIR, f"{error_file_id}.csv"), index=False)
+            response["error_file"] = f"/schedules/upload/errors/{error_file_id}"
+        return response
     except Exception as e:
+        db.rollback()
         logger.error(f"Falha ao processar o arquivo de escala: {e}")
         raise HTTPException(status_code=500, detail=f"Não foi possível processar o arquivo. Erro: {e}")
 
+@app.post("/schedules/upload")
+async def upload_schedule_file(db: Session = Depends(get_db_app), file: UploadFile = File(...), current_user: models.AppUser = Depends(get_current_user)):
+    if not file.filename.endswith(('.csv', '.xlsx')):
+        raise HTTPException(status_code=400, detail="Formato de arquivo inválido. Por favor, envie um .csv ou .xlsx")
+    return await run_in_db_executor(executor_app, _import_schedule_file, db, file.filename, file.file)
+
+@app.get("/schedules/upload/errors/{error_file_id}")
+def download_schedule_errors(error_file_id: str, current_user: models.AppUser = Depends(get_current_user)):
+    try:
+        error_file_id = uuid.UUID(error_file_id).hex # Impede caminhos arbitrários
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Arquivo de erros não encontrado.")
+    path = os.path.join(IMPORT_ERRORS_DIR, f"{error_file_id}.csv")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Arquivo de erros não encontrado.")
+    return FileResponse(path, media_type="text/csv", filename=f"erros_escala_{error_file_id[:8]}.csv")
+
+
+# --- TRABALHOS EM SEGUNDO PLANO ---
+# Executados pelos processos de job_worker.py; a API apenas enfileira e informa o andamento.
+
+def _run_monthly_report_job(db: Session, payload: Dict[str, Any], job: models.BackgroundJob, progress: Callable) -> Dict[str, Any]:
+    request = MonthlyReportRequest(**payload)
+    db_main = SessionLocal_Main()
+    try:
+        all_employees_map = _get_employee_names(db_main)
+    finally:
+        db_main.close()
+    total = len(request.employee_ids)
+    done = 0
+    result_path = jobs.job_file_path(job.id, ".json")
+    # O arquivo é escrito aos poucos, sem manter o relatório inteiro em memória
+    with open(result_path, "w", encoding="utf-8") as result_file:
+        result_file.write("[")
+        for chunk_report in _iter_monthly_report_chunks(request, all_employees_map, REPORT_CHUNK_SIZE):
+            for employee_report in chunk_report:
+                result_file.write(("," if done else "") + employee_report.json())
+                done += 1
+            progress(done * 100 // max(total, 1), f"{done} de {total} funcionário(s) calculado(s).")
+        result_file.write("]")
+    job.result_path = result_path
+    return {"employees": done}
+
+def _run_schedule_import_job(db: Session, payload: Dict[str, Any], job: models.BackgroundJob, progress: Callable) -> Dict[str, Any]:
+    file_size = os.path.getsize(payload["path"])
+    with open(payload["path"], "rb") as fileobj:
+        # O andamento é estimado pela posição de leitura no arquivo (o total de linhas só é conhecido no fim).
+        # Cada chamada de progress também renova updated_at, o que impede que claim_next_job devolva à fila
+        # (JOB_STALE_MINUTES) uma importação longa que ainda está em execução
+        def report_rows(rows: int) -> None:
+            percent = min(99, fileobj.tell() * 100 // max(file_size, 1))
+            progress(percent, f"{rows} linha(s) lidas.")
+        result = _import_schedule_file(db, payload["filename"], fileobj, on_chunk=report_rows)
+    os.remove(payload["path"])
+    return result
+
+JOB_HANDLERS = {
+    "monthly_report": _run_monthly_report_job,
+    "schedule_import": _run_schedule_import_job,
+}
+
+def _job_status(job: models.BackgroundJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "result_url": f"/jobs/{job.id}/result" if job.result_path else None,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+@app.post("/jobs/reports/monthly", status_code=202)
+def submit_monthly_report_job(request: MonthlyReportRequest, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    job = jobs.enqueue_job(db, "monthly_report", json.loads(request.json()), created_by=current_user.username)
+    return _job_status(job)
+
+@app.post("/jobs/schedules/upload", status_code=202)
+def submit_schedule_import_job(db: Session = Depends(get_db_app), file: UploadFile = File(...), current_user: models.AppUser = Depends(get_current_user)):
+    if not file.filename.endswith(('.csv', '.xlsx')):
+        raise HTTPException(status_code=400, detail="Formato de arquivo inválido. Por favor, envie um .csv ou .xlsx")
+    job_id = uuid.uuid4().hex
+    path = jobs.job_file_path(job_id, os.path.splitext(file.filename)[1])
+    with open(path, "wb") as destination:
+        shutil.copyfileobj(file.file, destination)
+    job = jobs.enqueue_job(db, "schedule_import", {"path": path, "filename": file.filename}, created_by=current_user.username, job_id=job_id)
+    return _job_status(job)
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    job = db.get(models.BackgroundJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabalho não encontrado.")
+    return _job_status(job)
+
+@app.get("/jobs/{job_id}/result")
+def download_job_result(job_id: str, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    job = db.get(models.BackgroundJob, job_id)
+    if not job or job.status != "done" or not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=404, detail="Resultado não disponível para este trabalho.")
+    return FileResponse(job.result_path, media_type="application/json", filename=f"{job.job_type}_{job.id[:8]}.json")
+
+# --- SALDOS DIÁRIOS MATERIALIZADOS ---
+@app.post("/daily-balances/invalidate")
+def invalidate_daily_balances(request: DailyBalanceInvalidationRequest, db: Session = Depends(get_db_app), current_user: models.AppUser = Depends(get_current_user)):
+    """Descarta os saldos gravados de um período (ex: após correções de batidas no Protheus) para que sejam recalculados."""
+    if request.start_date > request.end_date:
+        raise HTTPException(status_code=400, detail="A data de início não pode ser posterior à data de fim.")
+    query = db.query(models.DailyBalance).filter(
+        models.DailyBalance.work_date >= request.start_date,
+        models.DailyBalance.work_date <= request.end_date
+    )
+    if request.employee_ids:
+        query = query.filter(models.DailyBalance.employee_id.in_(request.employee_ids))
+    count = query.delete(synchronize_session=False)
+    db.commit()
+    return {"status": "success", "message": f"{count} saldo(s) diário(s) foram descartados."}
+
+# --- ESPELHO DAS BATIDAS DO PROTHEUS ---
+@app.post("/sync/protheus-punches")
+def sync_protheus_punches(db_app: Session = Depends(get_db_app), db_main: Session = Depends(get_db_main), current_user: models.AppUser = Depends(get_current_user)):
+    """Dispara manualmente a sincronização incremental de SP8010/SPG010 para o espelho local."""
+    try:
+        summary = protheus_sync.sync_protheus_punches(db_main, db_app)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao sincronizar batidas do Protheus: {e}")
+    return {"status": "success", "summary": summary}
+
+# --- CACHE DE METADADOS DE TURNO ---
+@app.get("/cache/shifts")
+def get_shift_cache_stats(current_user: models.AppUser = Depends(get_current_user)):
+    return {"status": "success", "cache": main_system_queries.shift_metadata_cache.stats()}
+
+@app.get("/metrics/db-pools")
+def get_db_pool_metrics(current_user: models.AppUser = Depends(get_current_user)):
+    return {"status": "success", "pools": get_pool_metrics()}
+
+@app.get("/cache/auth")
+def get_auth_cache_stats(current_user: models.AppUser = Depends(get_current_user)):
+    return {"status": "success", "cache": auth_user_cache.stats()}
+
+@app.post("/cache/auth/invalidate")
+def invalidate_auth_cache_endpoint(username: str, current_user: models.AppUser = Depends(get_current_user)):
+    """
+    Descarta o usuário do cache de autenticação, para usar depois de removê-lo ou desativá-lo no banco: a próxima
+    requisição com o token dele volta a consultar app_users e é recusada. Vale só para o processo que atender a
+    chamada; nos demais workers o token removido ainda é aceito por até AUTH_CACHE_TTL_SECONDS (padrão 60 s).
+    """
+    removed = invalidate_auth_cache(username)
+    return {"status": "success", "message": f"{removed} entrada(s) do usuário {username} foram removidas do cache."}
+
+@app.get("/report/monthly/in-flight")
+def get_monthly_report_flight_stats(current_user: models.AppUser = Depends(get_current_user)):
+    return {"status": "success", "single_flight": monthly_report_flights.stats()}
+
+@app.post("/cache/shifts/invalidate")
+def invalidate_shift_cache(shift_code: Optional[str] = None, db_app: Session = Depends(get_db_app), db_main: Session = Depends(get_db_main),
+                           current_user: models.AppUser = Depends(get_current_user)):
+    """Limpa o cache do turno e os saldos diários calculados com ele, que passam a ser recalculados com a definição nova."""
+    removed = main_system_queries.invalidate_shift_cache(shift_code)
+    try:
+        balances = _invalidate_shift_daily_balances(db_app, db_main, shift_code)
+        db_app.commit()
+    except Exception as e:
+        db_app.rollback()
+        logger.error(f"Erro ao descartar os saldos diários do turno {shift_code or '(todos)'}: {e}")
+        raise HTTPException(status_code=500, detail=f"Cache limpo, mas os saldos diários não foram descartados: {e}")
+    alvo = f"do turno {shift_code}" if shift_code else "de todos os turnos"
+    return {"status": "success", "message": f"{removed} entrada(s) de cache e {balances} saldo(s) diário(s) {alvo} foram removidos."}
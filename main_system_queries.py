@@ -1,11 +1,58 @@
 import logging
+import os
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, bindparam, VARCHAR
+from sqlalchemy.sql.expression import BindParameter
+from collections import Counter, defaultdict
 from datetime import datetime, date, time, timedelta
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional, List, Any, Iterable
+
+from cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# --- CACHE DE METADADOS DE TURNO (SPJ010/SR6010) ---
+# As definições de turno mudam poucas vezes por ano; o TTL pode ser ajustado por variável de ambiente
+# e o cache pode ser limpo manualmente pelo endpoint /cache/shifts/invalidate.
+SHIFT_CACHE_TTL_SECONDS = int(os.getenv("SHIFT_CACHE_TTL_SECONDS", "21600"))
+shift_metadata_cache = TTLCache(ttl_seconds=SHIFT_CACHE_TTL_SECONDS)
+
+def invalidate_shift_cache(shift_code: Optional[str] = None) -> int:
+    """Limpa o cache de turnos inteiro ou apenas as entradas de um turno. Retorna o número de entradas removidas."""
+    if not shift_code:
+        return shift_metadata_cache.invalidate()
+    code = shift_code.strip()
+    return shift_metadata_cache.invalidate(lambda key: key[1] == code)
+
+# --- PARÂMETROS DAS CONSULTAS AO PROTHEUS ---
+# As colunas do Protheus são VARCHAR completadas com espaços. Os filtros comparam a coluna crua, sem TRIM()
+# (que impede o SQL Server de usar os índices): no "=" o SQL Server já ignora os espaços à direita.
+# O que também impede o seek é o tipo do parâmetro: o pyodbc envia str como NVARCHAR, e a coluna VARCHAR é
+# convertida (CONVERT_IMPLICIT) linha a linha. Por isso os parâmetros são declarados como VARCHAR do tamanho
+# do campo (protheus_params), e o SQLAlchemy os informa ao pyodbc com cursor.setinputsizes (padrão do
+# dialeto mssql+pyodbc; não desligue use_setinputsizes no engine do Protheus).
+# Os tamanhos são fixos no código, conforme o dicionário (SX3) da base atual; confira-os se a base mudar.
+PROTHEUS_FIELD_SIZES = {
+    "filial": 4,       # RA_FILIAL, P8_FILIAL, PG_FILIAL
+    "filial_turno": 2, # PJ_FILIAL (tabela de turnos compartilhada por empresa)
+    "matricula": 6,    # RA_MAT, P8_MAT, PG_MAT
+    "turno": 3,        # RA_TNOTRAB, PJ_TURNO, R6_TURNO
+    "semana": 2,       # PJ_SEMANA
+    "dia": 1,          # PJ_DIA
+    "data": 8,         # P8_DATA, PG_DATA (AAAAMMDD)
+}
+
+def protheus_params(expanding: Iterable[str] = (), **fields: str) -> List[BindParameter]:
+    """
+    Parâmetros VARCHAR(tamanho do campo) para text().bindparams(): cada argumento é nome_do_parametro=campo
+    de PROTHEUS_FIELD_SIZES. Os nomes em `expanding` são listas (IN :nome).
+    """
+    return [bindparam(name, type_=VARCHAR(PROTHEUS_FIELD_SIZES[field]), expanding=name in expanding) for name, field in fields.items()]
+
+def _protheus_value(value: Optional[str]) -> str:
+    """Converte um parâmetro para o formato comparado com as colunas do Protheus (sem espaços nas bordas)."""
+    return (value or "").strip()
+
 def get_all_employees_from_main_system(db: Session) -> List[Dict[str, str]]:
     logger.info("Buscando lista de todos os funcionários ativos do sistema principal com descrição de turno.")
     sql_query = text("""
@@ -44,38 +91,51 @@ def get_all_employees_from_main_system(db: Session) -> List[Dict[str, str]]:
         raise e
 
 def get_shift_info(db: Session, shift_code: str) -> Dict:
+    cache_key = ("shift_info", shift_code.strip())
+    cached = shift_metadata_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
     shift_info = {
         "description": f"Turno {shift_code}",
         "weeks_in_cycle": 1,
         "planned_start_time": None
     }
 
-    desc_query = text("SELECT TOP 1 TRIM(R6_DESC) FROM SR6010 WHERE R6_TURNO = :shift_code AND D_E_L_E_T_ <> '*'")
-    description = db.execute(desc_query, {"shift_code": shift_code}).scalar_one_or_none()
+    desc_query = text("SELECT TOP 1 TRIM(R6_DESC) FROM SR6010 WHERE R6_TURNO = :shift_code AND D_E_L_E_T_ <> '*'").bindparams(
+        *protheus_params(shift_code="turno"))
+    shift_code_param = _protheus_value(shift_code)
+    description = db.execute(desc_query, {"shift_code": shift_code_param}).scalar_one_or_none()
     if description:
         shift_info["description"] = description
 
-    cycle_query = text("SELECT MAX(CAST(PJ_SEMANA AS INT)) FROM SPJ010 WHERE PJ_TURNO = :shift_code AND D_E_L_E_T_ <> '*'")
-    weeks = db.execute(cycle_query, {"shift_code": shift_code}).scalar_one_or_none()
+    cycle_query = text("SELECT MAX(CAST(PJ_SEMANA AS INT)) FROM SPJ010 WHERE PJ_TURNO = :shift_code AND D_E_L_E_T_ <> '*'").bindparams(
+        *protheus_params(shift_code="turno"))
+    weeks = db.execute(cycle_query, {"shift_code": shift_code_param}).scalar_one_or_none()
     if weeks and weeks > 0:
         shift_info["weeks_in_cycle"] = weeks
 
     start_time_query = text("""
         SELECT TOP 1 PJ_ENTRA1 FROM SPJ010 WHERE PJ_TURNO = :shift_code AND PJ_ENTRA1 > 0 AND D_E_L_E_T_ <> '*' ORDER BY PJ_SEMANA, PJ_DIA
-    """)
-    start_time_float = db.execute(start_time_query, {"shift_code": shift_code}).scalar_one_or_none()
+    """).bindparams(*protheus_params(shift_code="turno"))
+    start_time_float = db.execute(start_time_query, {"shift_code": shift_code_param}).scalar_one_or_none()
     if start_time_float is not None:
         hour = int(start_time_float)
         minute = int(round((start_time_float - hour) * 100))
         if 0 <= minute <= 59:
              shift_info["planned_start_time"] = time(hour, minute)
 
-    return shift_info
+    shift_metadata_cache.set(cache_key, shift_info)
+    return dict(shift_info)
 
 def get_work_schedule_info_for_day(db: Session, shift_code: str, filial: str, cycle_week: int, day_of_week: int) -> Dict[str, Any]:
     filial_curta = filial[:2]
     semana_formatada = str(cycle_week).zfill(2)
     dia_formatado = str(day_of_week)
+    cache_key = ("work_schedule", shift_code.strip(), filial_curta, semana_formatada, dia_formatado)
+    cached = shift_metadata_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
     logger.info(f"VERIFICANDO BANCO: PJ_TURNO='{shift_code}', PJ_FILIAL='{filial_curta}', PJ_SEMANA='{semana_formatada}', PJ_DIA='{dia_formatado}'")
     default_result = {"minutes": 0, "type": "F"}
     sql_query = text("""
@@ -83,15 +143,22 @@ def get_work_schedule_info_for_day(db: Session, shift_code: str, filial: str, cy
             (ISNULL(PJ_HRSTRAB, 0) + ISNULL(PJ_HRSTRA2, 0)) AS horas_trabalhadas,
             PJ_TPDIA
         FROM SPJ010
-        WHERE TRIM(PJ_TURNO) = :shift_code
-          AND (TRIM(PJ_FILIAL) = :filial OR TRIM(PJ_FILIAL) = '')
-          AND TRIM(PJ_SEMANA) = :cycle_week
-          AND TRIM(PJ_DIA) = :day_of_week
+        WHERE PJ_TURNO = :shift_code
+          AND PJ_FILIAL IN (:filial, :filial_compartilhada)
+          AND PJ_SEMANA = :cycle_week
+          AND PJ_DIA = :day_of_week
           AND D_E_L_E_T_ <> '*'
         ORDER BY PJ_FILIAL DESC;
-    """)
+    """).bindparams(*protheus_params(shift_code="turno", filial="filial_turno", filial_compartilhada="filial_turno",
+                                     cycle_week="semana", day_of_week="dia"))
     try:
-        result = db.execute(sql_query, {"shift_code": shift_code, "filial": filial_curta, "cycle_week": semana_formatada, "day_of_week": dia_formatado}).fetchone()
+        result = db.execute(sql_query, {
+            "shift_code": _protheus_value(shift_code),
+            "filial": _protheus_value(filial_curta),
+            "filial_compartilhada": _protheus_value(""),
+            "cycle_week": _protheus_value(semana_formatada),
+            "day_of_week": _protheus_value(dia_formatado)
+        }).fetchone()
         if result:
             hours = float(result.horas_trabalhadas or 0)
             parte_horas = int(hours)
@@ -99,10 +166,12 @@ def get_work_schedule_info_for_day(db: Session, shift_code: str, filial: str, cy
             total_minutes = (parte_horas * 60) + parte_minutos
             day_type = result.PJ_TPDIA.strip() if result.PJ_TPDIA else "S"
             logger.info(f"SUCESSO! Jornada encontrada para o turno {shift_code}: {total_minutes} minutos, Tipo: {day_type}.")
+            shift_metadata_cache.set(cache_key, {"minutes": total_minutes, "type": day_type})
             return {"minutes": total_minutes, "type": day_type}
         else:
             logger.warning(f"Jornada não encontrada para o turno {shift_code} na filial {filial_curta}. Assumindo folga.")
-            return default_result
+            shift_metadata_cache.set(cache_key, default_result)
+            return dict(default_result)
     except Exception as e:
         logger.error(f"Erro ao buscar jornada de trabalho para o turno {shift_code}: {e}")
         return default_result
@@ -114,9 +183,11 @@ def get_employee_shift_code(db: Session, employee_id: str) -> Optional[str]:
     sql_query = text("""
         SELECT TOP 1 TRIM(RA_TNOTRAB) AS shift_code FROM SRA010
         WHERE RA_FILIAL = :filial AND RA_MAT = :matricula AND (D_E_L_E_T_ IS NULL OR D_E_L_E_T_ <> '*')
-    """)
+    """).bindparams(*protheus_params(filial="filial", matricula="matricula"))
     try:
-        result = db.execute(sql_query, {"filial": filial, "matricula": matricula}).scalar_one_or_none()
+        result = db.execute(sql_query, {
+            "filial": _protheus_value(filial), "matricula": _protheus_value(matricula)
+        }).scalar_one_or_none()
         if result:
             logger.info(f"Turno encontrado para {employee_id}: {result}")
             return result
@@ -127,29 +198,44 @@ def get_employee_shift_code(db: Session, employee_id: str) -> Optional[str]:
         logger.error(f"Erro ao buscar turno para o funcionário {employee_id}: {e}")
         return None
 
+def get_employee_ids_by_shift(db: Session, shift_code: str) -> List[str]:
+    """Matrículas (filial + matrícula) dos funcionários cujo turno padrão (RA_TNOTRAB) é o informado."""
+    sql_query = text("""
+        SELECT RA_FILIAL AS filial, RA_MAT AS matricula FROM SRA010
+        WHERE RA_TNOTRAB = :turno AND (D_E_L_E_T_ IS NULL OR D_E_L_E_T_ <> '*')
+    """).bindparams(*protheus_params(turno="turno"))
+    results = db.execute(sql_query, {"turno": _protheus_value(shift_code)}).fetchall()
+    return [f"{row.filial}{row.matricula}" for row in results]
+
 def get_standard_shift_minutes(db: Session, shift_code: str) -> int:
+    cache_key = ("standard_minutes", shift_code.strip())
+    cached = shift_metadata_cache.get(cache_key)
+    if cached is not None:
+        return cached
     logger.info(f"Buscando jornada padrão para o turno: {shift_code}")
     sql_query = text("""
         SELECT TOP 1
             (ISNULL(PJ_HRSTRAB, 0) + ISNULL(PJ_HRSTRA2, 0)) AS horas_trabalhadas
         FROM SPJ010
-        WHERE TRIM(PJ_TURNO) = :shift_code
+        WHERE PJ_TURNO = :shift_code
           AND (ISNULL(PJ_HRSTRAB, 0) + ISNULL(PJ_HRSTRA2, 0)) > 0
           AND D_E_L_E_T_ <> '*'
         GROUP BY (ISNULL(PJ_HRSTRAB, 0) + ISNULL(PJ_HRSTRA2, 0))
         ORDER BY COUNT(*) DESC;
-    """)
+    """).bindparams(*protheus_params(shift_code="turno"))
     try:
-        result = db.execute(sql_query, {"shift_code": shift_code}).scalar_one_or_none()
+        result = db.execute(sql_query, {"shift_code": _protheus_value(shift_code)}).scalar_one_or_none()
         if result:
             hours = float(result or 0)
             parte_horas = int(hours)
             parte_minutos = int(round((hours - parte_horas) * 100))
             total_minutes = (parte_horas * 60) + parte_minutos
             logger.info(f"SUCESSO! Jornada padrão encontrada para o turno {shift_code}: {total_minutes} minutos.")
+            shift_metadata_cache.set(cache_key, total_minutes)
             return total_minutes
         else:
             logger.warning(f"Nenhuma jornada padrão encontrada para o turno {shift_code}. Retornando 0.")
+            shift_metadata_cache.set(cache_key, 0)
             return 0
     except Exception as e:
         logger.error(f"Erro ao buscar jornada padrão para o turno {shift_code}: {e}")
@@ -173,77 +259,252 @@ def get_schedule_times_for_day(db: Session, shift_code: str, filial: str, cycle_
     filial_curta = filial[:2]
     semana_formatada = str(cycle_week).zfill(2)
     dia_formatado = str(day_of_week)
+    cache_key = ("schedule_times", shift_code.strip(), filial_curta, semana_formatada, dia_formatado)
+    cached = shift_metadata_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
 
     # --- CORREÇÃO APLICADA AQUI ---
     sql_query = text("""
         SELECT TOP 1
             PJ_ENTRA1, PJ_SAIDA1, PJ_ENTRA2, PJ_SAIDA2
         FROM SPJ010
-        WHERE TRIM(PJ_TURNO) = :shift_code
-          AND (TRIM(PJ_FILIAL) = :filial OR TRIM(PJ_FILIAL) = '')
-          AND TRIM(PJ_SEMANA) = :cycle_week
-          AND TRIM(PJ_DIA) = :day_of_week
+        WHERE PJ_TURNO = :shift_code
+          AND PJ_FILIAL IN (:filial, :filial_compartilhada)
+          AND PJ_SEMANA = :cycle_week
+          AND PJ_DIA = :day_of_week
           AND D_E_L_E_T_ <> '*'
         ORDER BY PJ_FILIAL DESC;
-    """)
+    """).bindparams(*protheus_params(shift_code="turno", filial="filial_turno", filial_compartilhada="filial_turno",
+                                     cycle_week="semana", day_of_week="dia"))
     try:
         result = db.execute(sql_query, {
-            "shift_code": shift_code, "filial": filial_curta,
-            "cycle_week": semana_formatada, "day_of_week": dia_formatado
+            "shift_code": _protheus_value(shift_code),
+            "filial": _protheus_value(filial_curta),
+            "filial_compartilhada": _protheus_value(""),
+            "cycle_week": _protheus_value(semana_formatada),
+            "day_of_week": _protheus_value(dia_formatado)
         }).fetchone()
         if result:
             start_time = _convert_float_to_time(result.PJ_ENTRA1)
             # A saída final do turno é a última batida registrada (SAIDA2 ou, se não houver, SAIDA1)
             end_time = _convert_float_to_time(result.PJ_SAIDA2) or _convert_float_to_time(result.PJ_SAIDA1)
+            shift_metadata_cache.set(cache_key, {"start": start_time, "end": end_time})
             return {"start": start_time, "end": end_time}
+        shift_metadata_cache.set(cache_key, {"start": None, "end": None})
     except Exception as e:
         logger.error(f"Erro ao buscar horários da escala para o turno {shift_code}: {e}")
 
     return {"start": None, "end": None}
 
+# Origem das batidas: "protheus" (consulta SP8010/SPG010 ao vivo) ou "mirror" (espelho local mantido por protheus_sync.py)
+PUNCH_SOURCE = os.getenv("PUNCH_SOURCE", "protheus").lower()
+
+# O SQL Server aceita no máximo 2100 parâmetros por comando; as listas IN são quebradas em lotes menores.
+PUNCH_BATCH_SIZE = 1000
+
 def get_raw_punches_for_period(db: Session, employee_id: str, start_date: date, end_date: date) -> List[datetime]:
     """Busca todas as batidas de um funcionário em um período, retornando uma lista de datetimes."""
-    logger.info(f"Buscando todas as batidas brutas para {employee_id} de {start_date} a {end_date}")
-    filial_completa = employee_id[:4]
-    matricula = employee_id[4:]
+    return get_raw_punches_for_employees(db, [employee_id], start_date, end_date).get(employee_id, [])
+
+def get_raw_punches_for_employees(db: Session, employee_ids: List[str], start_date: date, end_date: date) -> Dict[str, List[datetime]]:
+    """
+    Busca as batidas de vários funcionários em um período com uma consulta por tabela (SP8010 e SPG010),
+    retornando um dicionário matrícula completa -> lista ordenada de datetimes.
+    """
+    requested_ids = list(dict.fromkeys(employee_ids))
+    if PUNCH_SOURCE == "mirror":
+        # Importações locais: protheus_sync depende deste módulo
+        import protheus_sync
+        from database import SessionLocal_App
+        logger.info(f"Buscando batidas no espelho local para {len(requested_ids)} funcionário(s) de {start_date} a {end_date}")
+        db_app = SessionLocal_App()
+        try:
+            return protheus_sync.get_mirrored_punches_for_employees(db_app, requested_ids, start_date, end_date)
+        finally:
+            db_app.close()
+    logger.info(f"Buscando todas as batidas brutas para {len(requested_ids)} funcionário(s) de {start_date} a {end_date}")
     start_str = start_date.strftime('%Y%m%d')
     end_str = end_date.strftime('%Y%m%d')
 
-    all_punches = []
+    punches_by_employee: Dict[str, set] = {emp_id: set() for emp_id in requested_ids}
 
-    def fetch_from_table(table_name: str, date_col: str, hour_col: str, mat_col: str, filial_col: str):
+    def fetch_from_table(table_name: str, date_col: str, hour_col: str, mat_col: str, filial_col: str, batch_ids: List[str]):
         sql = text(f"""
-            SELECT {date_col} AS data, {hour_col} AS hora
+            SELECT TRIM({filial_col}) AS filial, TRIM({mat_col}) AS matricula, {date_col} AS data, {hour_col} AS hora
             FROM {table_name}
-            WHERE TRIM({filial_col}) = :filial
-              AND TRIM({mat_col}) = :matricula
+            WHERE {filial_col} IN :filiais
+              AND {mat_col} IN :matriculas
               AND {date_col} BETWEEN :start_date AND :end_date
               AND (D_E_L_E_T_ IS NULL OR D_E_L_E_T_ <> '*')
-        """)
+        """).bindparams(*protheus_params(expanding=("filiais", "matriculas"), filiais="filial", matriculas="matricula",
+                                         start_date="data", end_date="data"))
         try:
             results = db.execute(sql, {
-                "filial": filial_completa, "matricula": matricula,
+                "filiais": sorted({_protheus_value(emp_id[:4]) for emp_id in batch_ids}),
+                "matriculas": sorted({_protheus_value(emp_id[4:]) for emp_id in batch_ids}),
                 "start_date": start_str, "end_date": end_str
             }).fetchall()
 
             for row in results:
+                # Filial e matrícula são filtradas separadamente; descarta combinações que não foram pedidas
+                employee_punches = punches_by_employee.get(f"{row.filial}{row.matricula}")
+                if employee_punches is None:
+                    continue
                 punch_time = _convert_float_to_time(row.hora)
                 if punch_time:
                     try:
                         punch_date = datetime.strptime(row.data.strip(), '%Y%m%d').date()
-                        all_punches.append(datetime.combine(punch_date, punch_time))
+                        employee_punches.add(datetime.combine(punch_date, punch_time))
                     except (ValueError, AttributeError):
                         continue # Ignora datas mal formatadas
         except Exception as e:
             logger.error(f"Erro ao buscar batidas da tabela {table_name}: {e}")
 
     # Busca nas duas tabelas
-    fetch_from_table('SP8010', 'P8_DATA', 'P8_HORA', 'P8_MAT', 'P8_FILIAL')
-    fetch_from_table('SPG010', 'PG_DATA', 'PG_HORA', 'PG_MAT', 'PG_FILIAL')
+    for i in range(0, len(requested_ids), PUNCH_BATCH_SIZE):
+        batch_ids = requested_ids[i:i + PUNCH_BATCH_SIZE]
+        fetch_from_table('SP8010', 'P8_DATA', 'P8_HORA', 'P8_MAT', 'P8_FILIAL', batch_ids)
+        fetch_from_table('SPG010', 'PG_DATA', 'PG_HORA', 'PG_MAT', 'PG_FILIAL', batch_ids)
 
     # Remove duplicatas e ordena
-    unique_punches = sorted(list(set(all_punches)))
-    logger.info(f"Encontradas {len(unique_punches)} batidas brutas para {employee_id}.")
-    return unique_punches
+    result = {emp_id: sorted(punches) for emp_id, punches in punches_by_employee.items()}
+    logger.info(f"Encontradas {sum(len(p) for p in result.values())} batidas brutas para {len(result)} funcionário(s).")
+    return result
+
+# --- CALENDÁRIO DE TURNOS PRÉ-CARREGADO ---
+
+def _convert_float_to_minutes(hour_float: Optional[float]) -> int:
+    """Converte uma duração em formato float do Protheus (ex: 7.20 = 7h20) para minutos."""
+    hours = float(hour_float or 0)
+    parte_horas = int(hours)
+    parte_minutos = int(round((hours - parte_horas) * 100))
+    return (parte_horas * 60) + parte_minutos
+
+class ShiftCalendar:
+    """
+    Cópia em memória das linhas da SPJ010 (e descrições da SR6010) de um conjunto de turnos.
+    Responde às mesmas perguntas das funções por dia acima, sem novas idas ao banco.
+    """
+
+    def __init__(self, schedule_rows: Iterable[Any], descriptions: Dict[str, str]):
+        self._descriptions = descriptions
+        self._rows_by_shift: Dict[str, List[Any]] = defaultdict(list)
+        self._rows_by_day: Dict[tuple, List[Any]] = defaultdict(list)
+        for row in schedule_rows:
+            self._rows_by_shift[row.turno].append(row)
+            self._rows_by_day[(row.turno, row.semana, row.dia)].append(row)
+        # Mesma prioridade do "ORDER BY PJ_FILIAL DESC": filial específica antes da compartilhada ('')
+        for rows in self._rows_by_day.values():
+            rows.sort(key=lambda r: r.filial or "", reverse=True)
+
+    def _find_day(self, shift_code: str, filial: str, cycle_week: int, day_of_week: int) -> Optional[Any]:
+        filial_curta = filial[:2]
+        key = ((shift_code or "").strip(), str(cycle_week).zfill(2), str(day_of_week))
+        for row in self._rows_by_day.get(key, []):
+            if (row.filial or "") in (filial_curta, ""):
+                return row
+        return None
+
+    def get_work_schedule_info_for_day(self, shift_code: str, filial: str, cycle_week: int, day_of_week: int) -> Dict[str, Any]:
+        row = self._find_day(shift_code, filial, cycle_week, day_of_week)
+        if row is None:
+            return {"minutes": 0, "type": "F"}
+        day_type = row.PJ_TPDIA.strip() if row.PJ_TPDIA else "S"
+        return {"minutes": _convert_float_to_minutes(row.horas_trabalhadas), "type": day_type}
+
+    def get_schedule_times_for_day(self, shift_code: str, filial: str, cycle_week: int, day_of_week: int) -> Dict[str, Optional[time]]:
+        row = self._find_day(shift_code, filial, cycle_week, day_of_week)
+        if row is None:
+            return {"start": None, "end": None}
+        start_time = _convert_float_to_time(row.PJ_ENTRA1)
+        end_time = _convert_float_to_time(row.PJ_SAIDA2) or _convert_float_to_time(row.PJ_SAIDA1)
+        return {"start": start_time, "end": end_time}
+
+    def get_standard_shift_minutes(self, shift_code: str) -> int:
+        rows = self._rows_by_shift.get((shift_code or "").strip(), [])
+        counts = Counter(float(r.horas_trabalhadas or 0) for r in rows if float(r.horas_trabalhadas or 0) > 0)
+        if not counts:
+            logger.warning(f"Nenhuma jornada padrão encontrada para o turno {shift_code}. Retornando 0.")
+            return 0
+        return _convert_float_to_minutes(counts.most_common(1)[0][0])
+
+    def get_shift_info(self, shift_code: str) -> Dict:
+        code = (shift_code or "").strip()
+        rows = self._rows_by_shift.get(code, [])
+        shift_info = {
+            "description": self._descriptions.get(code) or f"Turno {shift_code}",
+            "weeks_in_cycle": 1,
+            "planned_start_time": None
+        }
+        weeks = max((int(r.semana) for r in rows if (r.semana or "").isdigit()), default=0)
+        if weeks > 0:
+            shift_info["weeks_in_cycle"] = weeks
+        first_entry = min((r for r in rows if r.PJ_ENTRA1 and r.PJ_ENTRA1 > 0), key=lambda r: (r.semana or "", r.dia or ""), default=None)
+        if first_entry is not None:
+            hour = int(first_entry.PJ_ENTRA1)
+            minute = int(round((first_entry.PJ_ENTRA1 - hour) * 100))
+            if 0 <= minute <= 59:
+                shift_info["planned_start_time"] = time(hour, minute)
+        return shift_info
+
+def load_shift_calendar(db: Session, shift_codes: Iterable[Optional[str]]) -> ShiftCalendar:
+    """
+    Carrega, em uma única consulta por tabela, a escala SPJ010 e a descrição SR6010 de todos os turnos informados.
+    Turnos que já estão no cache de metadados não são consultados novamente.
+    """
+    codes = sorted({code.strip() for code in shift_codes if code and code.strip()})
+    calendar_rows: List[Any] = []
+    descriptions: Dict[str, str] = {}
+    missing_codes = []
+    for code in codes:
+        cached = shift_metadata_cache.get(("calendar", code))
+        if cached is None:
+            missing_codes.append(code)
+            continue
+        rows, description = cached
+        calendar_rows.extend(rows)
+        if description:
+            descriptions[code] = description
+    if not missing_codes:
+        return ShiftCalendar(calendar_rows, descriptions)
+    logger.info(f"Carregando calendário de turnos para {len(missing_codes)} turno(s): {missing_codes}")
+
+    schedule_query = text("""
+        SELECT
+            TRIM(PJ_FILIAL) AS filial,
+            TRIM(PJ_TURNO) AS turno,
+            TRIM(PJ_SEMANA) AS semana,
+            TRIM(PJ_DIA) AS dia,
+            PJ_TPDIA,
+            (ISNULL(PJ_HRSTRAB, 0) + ISNULL(PJ_HRSTRA2, 0)) AS horas_trabalhadas,
+            PJ_ENTRA1, PJ_SAIDA1, PJ_ENTRA2, PJ_SAIDA2
+        FROM SPJ010
+        WHERE PJ_TURNO IN :shift_codes
+          AND D_E_L_E_T_ <> '*'
+    """).bindparams(*protheus_params(expanding=("shift_codes",), shift_codes="turno"))
+    desc_query = text("""
+        SELECT TRIM(R6_TURNO) AS turno, TRIM(R6_DESC) AS descricao
+        FROM SR6010
+        WHERE R6_TURNO IN :shift_codes AND D_E_L_E_T_ <> '*'
+    """).bindparams(*protheus_params(expanding=("shift_codes",), shift_codes="turno"))
+    try:
+        shift_code_params = [_protheus_value(code) for code in missing_codes]
+        schedule_rows = db.execute(schedule_query, {"shift_codes": shift_code_params}).fetchall()
+        loaded_descriptions: Dict[str, str] = {}
+        for row in db.execute(desc_query, {"shift_codes": shift_code_params}).fetchall():
+            if row.descricao:
+                loaded_descriptions.setdefault(row.turno, row.descricao)
+        logger.info(f"Calendário carregado: {len(schedule_rows)} linhas da SPJ010.")
+    except Exception as e:
+        logger.error(f"Erro ao carregar calendário de turnos {missing_codes}: {e}")
+        raise e
 
-    
\ No newline at end of file
+    rows_by_code: Dict[str, List[Any]] = defaultdict(list)
+    for row in schedule_rows:
+        rows_by_code[row.turno].append(row)
+    for code in missing_codes:
+        shift_metadata_cache.set(("calendar", code), (rows_by_code[code], loaded_descriptions.get(code)))
+    calendar_rows.extend(schedule_rows)
+    descriptions.update(loaded_descriptions)
+    return ShiftCalendar(calendar_rows, descriptions)
@@ -0,0 +1,59 @@
+# migrations.py
+# Alterações de esquema do banco da aplicação que o create_all não faz: colunas novas em tabelas que já existem.
+# Deve ser executado uma vez a cada atualização, antes de subir a API e o job_worker, com um usuário que tenha
+# permissão de DDL. A API só confere se o esquema está em dia (ver check_schema) e não altera tabelas.
+#
+# Uso:
+#   python migrations.py
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# (tabela, coluna, DDL). Os comandos usam IF NOT EXISTS e podem ser repetidos sem efeito.
+COLUMN_MIGRATIONS: List[Tuple[str, str, str]] = [
+    ("app_users", "token_version", "ALTER TABLE app_users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def missing_columns(engine: Engine) -> List[str]:
+    """Colunas de COLUMN_MIGRATIONS que ainda não existem no banco, como 'tabela.coluna'. Só lê o catálogo."""
+    inspector = inspect(engine)
+    missing = []
+    for table, column, _ in COLUMN_MIGRATIONS:
+        if inspector.has_table(table) and column not in {c["name"] for c in inspector.get_columns(table)}:
+            missing.append(f"{table}.{column}")
+    return missing
+
+
+def check_schema(engine: Engine) -> None:
+    """Interrompe a inicialização se faltar alguma migração, em vez de falhar depois em cada requisição."""
+    missing = missing_columns(engine)
+    if missing:
+        raise RuntimeError(f"Esquema do banco desatualizado (faltam {', '.join(missing)}); execute 'python migrations.py'.")
+
+
+def migrate(engine: Engine) -> List[str]:
+    """Cria as tabelas que faltam e aplica as migrações de coluna pendentes. Retorna as colunas adicionadas."""
+    models.Base.metadata.create_all(bind=engine)
+    missing = set(missing_columns(engine))
+    applied = []
+    with engine.begin() as connection:
+        for table, column, ddl in COLUMN_MIGRATIONS:
+            if f"{table}.{column}" in missing:
+                connection.execute(text(ddl))
+                applied.append(f"{table}.{column}")
+                logger.info(f"Coluna {table}.{column} adicionada.")
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine_app
+    logging.basicConfig(level=logging.INFO)
+    aplicadas = migrate(engine_app)
+    print(f"Migrações aplicadas: {', '.join(aplicadas) if aplicadas else 'nenhuma (esquema em dia)'}")
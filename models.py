@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Time, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, Time, DateTime, Boolean, Float, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -8,6 +8,8 @@ class AppUser(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
+    # Incrementado a cada troca de senha; tokens emitidos com versão anterior deixam de valer
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
 class ExternalPunch(Base):
     __tablename__ = 'external_punches'
@@ -45,4 +47,87 @@ class EscalaDiaria(Base):
     # O turno específico para aquele dia (pode ser nulo se for folga)
     shift_code = Column(String, nullable=True) 
     
-    __table_args__ = (UniqueConstraint('employee_id', 'work_date', name='_employee_schedule_date_uc'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('employee_id', 'work_date', name='_employee_schedule_date_uc'),)
+
+class DailyBalance(Base):
+    __tablename__ = 'daily_balances'
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(String, index=True, nullable=False)
+    work_date = Column(Date, index=True, nullable=False)
+    # O ciclo de escala usado no cálculo muda a semana do turno, por isso faz parte da chave
+    cycle_start_date = Column(Date, nullable=False)
+
+    # Batidas do sistema principal usadas no cálculo do dia
+    entry1 = Column(Time, nullable=True)
+    exit1 = Column(Time, nullable=True)
+    entry2 = Column(Time, nullable=True)
+    exit2 = Column(Time, nullable=True)
+
+    normal = Column(Integer, nullable=False, default=0)
+    overtime_50 = Column(Integer, nullable=False, default=0)
+    overtime_100 = Column(Integer, nullable=False, default=0)
+    undertime = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=True)
+
+    __table_args__ = (UniqueConstraint('employee_id', 'work_date', 'cycle_start_date', name='_employee_balance_date_uc'),)
+
+
+class ProtheusPunch(Base):
+    """Espelho local das batidas das tabelas SP8010/SPG010 do Protheus."""
+    __tablename__ = 'protheus_punches'
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_table = Column(String, nullable=False) # 'SP8010' ou 'SPG010'
+    recno = Column(BigInteger, nullable=False) # R_E_C_N_O_ da linha de origem
+    employee_id = Column(String, nullable=False) # filial + matrícula
+    punch_date = Column(Date, nullable=True)
+    punch_datetime = Column(DateTime, nullable=True) # nulo quando data/hora de origem são inválidas
+    deleted = Column(Boolean, nullable=False, default=False) # D_E_L_E_T_ = '*'
+
+    __table_args__ = (
+        UniqueConstraint('source_table', 'recno', name='_protheus_punch_recno_uc'),
+        Index('ix_protheus_punches_employee_date', 'employee_id', 'punch_date'),
+    )
+
+class ProtheusSyncState(Base):
+    __tablename__ = 'protheus_sync_state'
+
+    source_table = Column(String, primary_key=True)
+    last_recno = Column(BigInteger, nullable=False, default=0)
+    last_sync_at = Column(DateTime, nullable=True)
+
+class BackgroundJob(Base):
+    __tablename__ = 'background_jobs'
+
+    id = Column(String, primary_key=True) # uuid hex
+    job_type = Column(String, nullable=False) # Ex: 'monthly_report', 'schedule_import'
+    status = Column(String, nullable=False, default='queued', index=True) # queued, running, done, failed
+    progress = Column(Integer, nullable=False, default=0) # 0 a 100
+    message = Column(String, nullable=True)
+    payload = Column(Text, nullable=True) # JSON com os parâmetros do trabalho
+    result = Column(Text, nullable=True) # JSON com o resumo do resultado
+    result_path = Column(String, nullable=True) # Arquivo para download, quando houver
+    error = Column(Text, nullable=True)
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False) # Também serve de sinal de vida do worker
+    finished_at = Column(DateTime, nullable=True)
+
+class FacePunchVerification(Base):
+    """Resultado da verificação facial de uma batida enviada com foto."""
+    __tablename__ = 'face_punch_verifications'
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(String, index=True, nullable=False)
+    punch_datetime = Column(DateTime, nullable=False)
+    photo_path = Column(String, nullable=False) # Relativo a fotos_batidas/
+    verified = Column(Boolean, nullable=False)
+    distance = Column(Float, nullable=False)
+    tolerance = Column(Float, nullable=False)
+    model_name = Column(String, nullable=False)
+    elapsed_ms = Column(Float, nullable=False) # Tempo da verificação, sem carga do modelo
+    external_punch_id = Column(Integer, index=True, nullable=True) # external_punches.id, quando a batida foi registrada
+    punch_slot = Column(String, nullable=True) # 'entry1', 'exit1', 'entry2' ou 'exit2'
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
@@ -0,0 +1,189 @@
+# protheus_sync.py
+# Copia incrementalmente as batidas do Protheus (SP8010/SPG010) para o PostgreSQL da aplicação,
+# para que os relatórios não precisem consultar o SQL Server do ERP a cada chamada.
+#
+# Uso (ex: agendado no cron a cada 10 minutos):
+#   python protheus_sync.py
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+from main_system_queries import _convert_float_to_time, protheus_params
+
+logger = logging.getLogger(__name__)
+
+# (tabela, coluna filial, coluna matrícula, coluna data, coluna hora)
+PUNCH_TABLES = [
+    ("SP8010", "P8_FILIAL", "P8_MAT", "P8_DATA", "P8_HORA"),
+    ("SPG010", "PG_FILIAL", "PG_MAT", "PG_DATA", "PG_HORA"),
+]
+# Quantidade de R_E_C_N_O_ lidos por consulta ao Protheus
+SYNC_BATCH_SIZE = int(os.getenv("PUNCH_SYNC_BATCH_SIZE", "5000"))
+# O Protheus marca exclusões (D_E_L_E_T_ = '*') e correções na própria linha, sem mudar o R_E_C_N_O_.
+# As linhas desse período recente são relidas a cada sincronização para capturar essas alterações.
+SYNC_LOOKBACK_DAYS = int(os.getenv("PUNCH_SYNC_LOOKBACK_DAYS", "45"))
+
+def _parse_punch(row) -> Dict[str, Any]:
+    punch_date, punch_datetime = None, None
+    try:
+        punch_date = datetime.strptime(row.data.strip(), '%Y%m%d').date()
+        punch_time = _convert_float_to_time(row.hora)
+        if punch_time:
+            punch_datetime = datetime.combine(punch_date, punch_time)
+    except (ValueError, AttributeError):
+        pass # Data mal formatada: a linha é espelhada, mas nunca é lida pelos relatórios
+    return {
+        "employee_id": f"{(row.filial or '').strip()}{(row.matricula or '').strip()}",
+        "punch_date": punch_date,
+        "punch_datetime": punch_datetime,
+        "deleted": (row.deletado or "").strip() == "*",
+    }
+
+def _upsert_punches(db_app: Session, rows: List[Dict[str, Any]]) -> None:
+    insert = sqlite_insert if db_app.get_bind().dialect.name == "sqlite" else pg_insert
+    stmt = insert(models.ProtheusPunch).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["source_table", "recno"],
+        set_={col: stmt.excluded[col] for col in ["employee_id", "punch_date", "punch_datetime", "deleted"]}
+    )
+    db_app.execute(stmt)
+
+def _invalidate_changed_days(db_app: Session, changed_days: Dict[str, set]) -> int:
+    """
+    Descarta os saldos materializados dos dias afetados (e do dia anterior, por causa de turnos noturnos).
+    Não faz commit: roda na mesma transação que grava as batidas, para que uma falha no meio não deixe saldos
+    calculados com batidas antigas (a próxima sincronização não veria mais diferença nessas linhas).
+    """
+    deleted = 0
+    for employee_id, days in changed_days.items():
+        deleted += db_app.query(models.DailyBalance).filter(
+            models.DailyBalance.employee_id == employee_id,
+            models.DailyBalance.work_date >= min(days) - timedelta(days=1),
+            models.DailyBalance.work_date <= max(days)
+        ).delete(synchronize_session=False)
+    return deleted
+
+def _apply_batch(db_app: Session, table_name: str, source_rows) -> Tuple[int, int]:
+    """
+    Grava no espelho as linhas novas ou alteradas do lote e descarta os saldos dos dias afetados, sem commit.
+    Retorna (linhas alteradas, saldos descartados).
+    """
+    if not source_rows:
+        return 0, 0
+    recnos = [row.recno for row in source_rows]
+    existing = {
+        p.recno: (p.employee_id, p.punch_datetime, p.deleted)
+        for p in db_app.query(models.ProtheusPunch).filter(
+            models.ProtheusPunch.source_table == table_name,
+            models.ProtheusPunch.recno.in_(recnos)
+        ).all()
+    }
+    changed = []
+    changed_days: Dict[str, set] = defaultdict(set)
+    for row in source_rows:
+        punch = _parse_punch(row)
+        previous = existing.get(row.recno)
+        if previous == (punch["employee_id"], punch["punch_datetime"], punch["deleted"]):
+            continue
+        changed.append({"source_table": table_name, "recno": row.recno, **punch})
+        if punch["punch_date"]:
+            changed_days[punch["employee_id"]].add(punch["punch_date"])
+        if previous and previous[1]:
+            changed_days[previous[0]].add(previous[1].date())
+    if not changed:
+        return 0, 0
+    _upsert_punches(db_app, changed)
+    return len(changed), _invalidate_changed_days(db_app, changed_days)
+
+def _sync_table(db_main: Session, db_app: Session, table_name: str, filial_col: str, mat_col: str, date_col: str, hour_col: str) -> Tuple[int, int]:
+    """Sincroniza uma tabela de batidas. Retorna (linhas novas ou alteradas, saldos descartados)."""
+    state = db_app.get(models.ProtheusSyncState, table_name)
+    if state is None:
+        state = models.ProtheusSyncState(source_table=table_name, last_recno=0)
+        db_app.add(state)
+    columns = f"R_E_C_N_O_ AS recno, {filial_col} AS filial, {mat_col} AS matricula, {date_col} AS data, {hour_col} AS hora, D_E_L_E_T_ AS deletado"
+    changed_count, invalidated_count = 0, 0
+
+    # 1. Linhas alteradas no período recente (já espelhadas anteriormente), por faixas de R_E_C_N_O_ a partir
+    # da primeira linha do período, para que cada consulta traga no máximo SYNC_BATCH_SIZE linhas
+    since_date = (date.today() - timedelta(days=SYNC_LOOKBACK_DAYS)).strftime('%Y%m%d')
+    recent_filter = f"{date_col} >= :since_date AND R_E_C_N_O_ > :lower_recno AND R_E_C_N_O_ <= :upper_recno"
+    first_recent_recno = db_main.execute(
+        text(f"SELECT MIN(R_E_C_N_O_) FROM {table_name} WHERE {recent_filter}").bindparams(*protheus_params(since_date="data")),
+        {"since_date": since_date, "lower_recno": 0, "upper_recno": state.last_recno}
+    ).scalar()
+    lower_recno = (first_recent_recno - 1) if first_recent_recno is not None else state.last_recno
+    recent_query = text(f"SELECT {columns} FROM {table_name} WHERE {recent_filter}").bindparams(*protheus_params(since_date="data"))
+    while lower_recno < state.last_recno:
+        upper_recno = min(lower_recno + SYNC_BATCH_SIZE, state.last_recno)
+        recent_rows = db_main.execute(recent_query, {"since_date": since_date, "lower_recno": lower_recno, "upper_recno": upper_recno}).fetchall()
+        changed, invalidated = _apply_batch(db_app, table_name, recent_rows)
+        changed_count, invalidated_count = changed_count + changed, invalidated_count + invalidated
+        db_app.commit()
+        lower_recno = upper_recno
+
+    # 2. Linhas novas, por faixas de R_E_C_N_O_
+    max_recno = db_main.execute(text(f"SELECT MAX(R_E_C_N_O_) FROM {table_name}")).scalar() or 0
+    while state.last_recno < max_recno:
+        upper_recno = min(state.last_recno + SYNC_BATCH_SIZE, max_recno)
+        new_rows = db_main.execute(text(f"""
+            SELECT {columns} FROM {table_name}
+            WHERE R_E_C_N_O_ > :last_recno AND R_E_C_N_O_ <= :upper_recno
+        """), {"last_recno": state.last_recno, "upper_recno": upper_recno}).fetchall()
+        changed, invalidated = _apply_batch(db_app, table_name, new_rows)
+        changed_count, invalidated_count = changed_count + changed, invalidated_count + invalidated
+        state.last_recno = upper_recno
+        db_app.commit() # Batidas, saldos descartados e marca d'água da faixa são gravados juntos
+
+    state.last_sync_at = datetime.now()
+    db_app.commit()
+    return changed_count, invalidated_count
+
+def sync_protheus_punches(db_main: Session, db_app: Session) -> Dict[str, Any]:
+    """Sincroniza SP8010 e SPG010 com o espelho local. Retorna um resumo por tabela."""
+    summary = {"invalidated_daily_balances": 0}
+    for table_name, filial_col, mat_col, date_col, hour_col in PUNCH_TABLES:
+        try:
+            summary[table_name], invalidated = _sync_table(db_main, db_app, table_name, filial_col, mat_col, date_col, hour_col)
+            summary["invalidated_daily_balances"] += invalidated
+            logger.info(f"Sincronização de {table_name}: {summary[table_name]} linha(s) nova(s) ou alterada(s).")
+        except Exception as e:
+            db_app.rollback()
+            logger.error(f"Erro ao sincronizar a tabela {table_name}: {e}")
+            raise e
+    return summary
+
+def get_mirrored_punches_for_employees(db_app: Session, employee_ids: List[str], start_date: date, end_date: date) -> Dict[str, List[datetime]]:
+    """Mesmo contrato de main_system_queries.get_raw_punches_for_employees, lendo do espelho local."""
+    punches_by_employee: Dict[str, set] = {emp_id: set() for emp_id in dict.fromkeys(employee_ids)}
+    for i in range(0, len(employee_ids), 1000):
+        rows = db_app.query(models.ProtheusPunch.employee_id, models.ProtheusPunch.punch_datetime).filter(
+            models.ProtheusPunch.employee_id.in_(employee_ids[i:i + 1000]),
+            models.ProtheusPunch.punch_date >= start_date,
+            models.ProtheusPunch.punch_date <= end_date,
+            models.ProtheusPunch.punch_datetime.isnot(None),
+            models.ProtheusPunch.deleted.is_(False)
+        ).all()
+        for employee_id, punch_datetime in rows:
+            punches_by_employee[employee_id].add(punch_datetime)
+    return {emp_id: sorted(punches) for emp_id, punches in punches_by_employee.items()}
+
+# --- Ponto de entrada do script ---
+if __name__ == "__main__":
+    from database import SessionLocal_App, SessionLocal_Main, engine_app
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=engine_app)
+    db_main, db_app = SessionLocal_Main(), SessionLocal_App()
+    try:
+        print(sync_protheus_punches(db_main, db_app))
+    finally:
+        db_main.close()
+        db_app.close()
@@ -10,6 +10,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const cycleStartDateInput = document.getElementById('cycle-start-date-input');
     const generateReportBtn = document.getElementById('generate-report-btn');
     const reportResultDiv = document.getElementById('report-result');
+    const streamReportInput = document.getElementById('stream-report-input');
     let authToken = null;
     const today = new Date();
     monthInput.value = `${today.getFullYear()}-${String(today.getMonth() + 1).padStart(2, '0')}`;
@@ -104,8 +105,9 @@ document.addEventListener('DOMContentLoaded', () => {
         generateReportBtn.disabled = true;
         generateReportBtn.textContent = 'Gerando...';
         reportResultDiv.innerHTML = '<div class="loader"></div>';
+        const streaming = streamReportInput.checked;
         try {
-            const response = await fetch('/report/monthly', {
+            const response = await fetch(streaming ? '/report/monthly/stream' : '/report/monthly', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${authToken}` },
                 body: JSON.stringify({
@@ -119,11 +121,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 const errorData = await response.json();
                 throw new Error(`Erro na API: ${errorData.detail || response.statusText}`);
             }
-            const result = await response.json();
-            renderDetailedReport(result);
+            const employeeCount = streaming ? await renderStreamedReport(response) : renderDetailedReport(await response.json());
+            if (employeeCount === 0) {
+                reportResultDiv.innerHTML = '<p>Nenhum dado encontrado para os filtros selecionados.</p>';
+            }
         } catch (error)
         {
-            reportResultDiv.innerHTML = `<p class="error-message">Falha ao gerar o relatório: ${error.message}</p>`;
+            // No modo em NDJSON os funcionários já exibidos continuam na tela, acima do erro
+            if (!streaming || !reportResultDiv.querySelector('.employee-report')) reportResultDiv.innerHTML = '';
+            reportResultDiv.insertAdjacentHTML('beforeend', `<p class="error-message">Falha ao gerar o relatório: ${error.message}</p>`);
         } finally {
             generateReportBtn.disabled = false;
             generateReportBtn.textContent = 'Gerar Relatório';
@@ -131,93 +137,126 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function renderDetailedReport(data) {
-        if (!data || data.length === 0) {
-            reportResultDiv.innerHTML = '<p>Nenhum dado encontrado para os filtros selecionados.</p>';
-            return;
-        }
-        const formatTime = (timeStr) => timeStr ? timeStr.substring(0, 5) : '---';
-        let reportHTML = '';
+        reportResultDiv.innerHTML = data.map(renderEmployeeReport).join('');
+        return data.length;
+    }
 
-        data.forEach(employeeData => {
-            reportHTML += `<div class="employee-report">
-                <h2>${employeeData.employee_name} (${employeeData.employee_id})</h2>
-                <h3 class="shift-description">Turno Padrão: ${employeeData.shift_description}</h3>
-                <div class="table-wrapper">
-                    <table>
-                        <thead>
-                            <tr>
-                                <th rowspan="2">Data</th>
-                                <th colspan="4">Batidas Sistema Principal</th>
-                                <th colspan="4">Batidas Aplicativo</th>
-                                <th colspan="4">Horas Calculadas</th>
-                            </tr>
-                            <tr>
-                                <th>E1</th><th>S1</th><th>E2</th><th>S2</th>
-                                <th>E1</th><th>S1</th><th>E2</th><th>S2</th>
-                                <th>Normais</th>
-                                <th>HE 50%</th>
-                                <th>HE 100%</th>
-                                <th>Faltas/Atrasos</th>
-                            </tr>
-                        </thead>
-                        <tbody>`;
-            
-            employeeData.daily_breakdown.forEach(day => {
-                const isSunday = new Date(day.date).getUTCDay() === 0;
-                const rowClass = isSunday ? 'sunday-row' : '';
-                
-                let calculatedCells = '';
-                const hasWorked = day.calculated_minutes.normal > 0 || day.calculated_minutes.overtime_50 > 0 || day.calculated_minutes.overtime_100 > 0;
-                
-                if (day.status && !hasWorked) {
-                    calculatedCells = `<td colspan="4" class="status-cell">${day.status}</td>`;
-                } else {
-                    calculatedCells = `
-                        <td>${formatarMinutosParaHHMM(day.calculated_minutes.normal)}</td>
-                        <td>${formatarMinutosParaHHMM(day.calculated_minutes.overtime_50)}</td>
-                        <td>${formatarMinutosParaHHMM(day.calculated_minutes.overtime_100)}</td>
-                        <td>${formatarMinutosParaHHMM(day.calculated_minutes.undertime)}</td>`;
+    async function renderStreamedReport(response) {
+        // Cada linha da resposta é o relatório de um funcionário, exibido assim que chega. A última linha
+        // confirma o fim ({"done": true}) ou traz o erro ocorrido no meio do envio ({"error": ...}).
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let employeeCount = 0;
+        let finished = false;
+        const appendLines = (lines) => {
+            lines.filter(line => line.trim()).forEach(line => {
+                const item = JSON.parse(line);
+                if (item.error) throw new Error(item.error);
+                if (item.done) {
+                    finished = true;
+                    return;
                 }
-                
-                reportHTML += `<tr class="${rowClass}">
-                    <td>${day.date}</td>
-                    <td>${formatTime(day.main_system_punches.entry1)}</td>
-                    <td>${formatTime(day.main_system_punches.exit1)}</td>
-                    <td>${formatTime(day.main_system_punches.entry2)}</td>
-                    <td>${formatTime(day.main_system_punches.exit2)}</td>
-                    <td>${formatTime(day.app_punches.entry1)}</td>
-                    <td>${formatTime(day.app_punches.exit1)}</td>
-                    <td>${formatTime(day.app_punches.entry2)}</td>
-                    <td>${formatTime(day.app_punches.exit2)}</td>
-                    ${calculatedCells}
-                </tr>`;
+                if (employeeCount === 0) reportResultDiv.innerHTML = '';
+                reportResultDiv.insertAdjacentHTML('beforeend', renderEmployeeReport(item));
+                employeeCount++;
             });
+        };
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            appendLines(lines);
+        }
+        appendLines([buffer]);
+        if (!finished) {
+            throw new Error(`a conexão terminou antes do fim do relatório (${employeeCount} funcionário(s) recebidos).`);
+        }
+        return employeeCount;
+    }
+
+    function renderEmployeeReport(employeeData) {
+        const formatTime = (timeStr) => timeStr ? timeStr.substring(0, 5) : '---';
+        let reportHTML = `<div class="employee-report">
+            <h2>${employeeData.employee_name} (${employeeData.employee_id})</h2>
+            <h3 class="shift-description">Turno Padrão: ${employeeData.shift_description}</h3>
+            <div class="table-wrapper">
+                <table>
+                    <thead>
+                        <tr>
+                            <th rowspan="2">Data</th>
+                            <th colspan="4">Batidas Sistema Principal</th>
+                            <th colspan="4">Batidas Aplicativo</th>
+                            <th colspan="4">Horas Calculadas</th>
+                        </tr>
+                        <tr>
+                            <th>E1</th><th>S1</th><th>E2</th><th>S2</th>
+                            <th>E1</th><th>S1</th><th>E2</th><th>S2</th>
+                            <th>Normais</th>
+                            <th>HE 50%</th>
+                            <th>HE 100%</th>
+                            <th>Faltas/Atrasos</th>
+                        </tr>
+                    </thead>
+                    <tbody>`;
+        
+        employeeData.daily_breakdown.forEach(day => {
+            const isSunday = new Date(day.date).getUTCDay() === 0;
+            const rowClass = isSunday ? 'sunday-row' : '';
             
-            const totals = employeeData.totals_in_minutes;
-            const saldoFinal = totals.overtime_50 + totals.overtime_100 + totals.undertime;
+            let calculatedCells = '';
+            const hasWorked = day.calculated_minutes.normal > 0 || day.calculated_minutes.overtime_50 > 0 || day.calculated_minutes.overtime_100 > 0;
             
-            reportHTML += `</tbody>
-                <tfoot>
-                    <tr>
-                        <td colspan="9"><strong>TOTAIS DO MÊS</strong></td>
-                        <td><strong>${formatarMinutosParaHHMM(totals.normal)}</strong></td>
-                        <td><strong>${formatarMinutosParaHHMM(totals.overtime_50)}</strong></td>
-                        <td><strong>${formatarMinutosParaHHMM(totals.overtime_100)}</strong></td>
-                        <td><strong>${formatarMinutosParaHHMM(totals.undertime)}</strong></td>
-                    </tr>
-                    <tr>
-                        <td colspan="10" style="text-align:right;"><strong>Resumo de Extras (50% + 100%):</strong></td>
-                        <td colspan="3"><strong>${formatarMinutosParaHHMM(totals.overtime_50 + totals.overtime_100)}</strong></td>
-                    </tr>
-                     <tr>
-                        <td colspan="10" style="text-align:right;"><strong>SALDO FINAL (EXTRAS - FALTAS):</strong></td>
-                        <td colspan="3" style="font-size: 1.1em;"><strong>${formatarMinutosParaHHMM(saldoFinal)}</strong></td>
-                    </tr>
-                </tfoot>
-            </table>
-            </div></div>`;
+            if (day.status && !hasWorked) {
+                calculatedCells = `<td colspan="4" class="status-cell">${day.status}</td>`;
+            } else {
+                calculatedCells = `
+                    <td>${formatarMinutosParaHHMM(day.calculated_minutes.normal)}</td>
+                    <td>${formatarMinutosParaHHMM(day.calculated_minutes.overtime_50)}</td>
+                    <td>${formatarMinutosParaHHMM(day.calculated_minutes.overtime_100)}</td>
+                    <td>${formatarMinutosParaHHMM(day.calculated_minutes.undertime)}</td>`;
+            }
+            
+            reportHTML += `<tr class="${rowClass}">
+                <td>${day.date}</td>
+                <td>${formatTime(day.main_system_punches.entry1)}</td>
+                <td>${formatTime(day.main_system_punches.exit1)}</td>
+                <td>${formatTime(day.main_system_punches.entry2)}</td>
+                <td>${formatTime(day.main_system_punches.exit2)}</td>
+                <td>${formatTime(day.app_punches.entry1)}</td>
+                <td>${formatTime(day.app_punches.exit1)}</td>
+                <td>${formatTime(day.app_punches.entry2)}</td>
+                <td>${formatTime(day.app_punches.exit2)}</td>
+                ${calculatedCells}
+            </tr>`;
         });
-        reportResultDiv.innerHTML = reportHTML;
+        
+        const totals = employeeData.totals_in_minutes;
+        const saldoFinal = totals.overtime_50 + totals.overtime_100 + totals.undertime;
+        
+        reportHTML += `</tbody>
+            <tfoot>
+                <tr>
+                    <td colspan="9"><strong>TOTAIS DO MÊS</strong></td>
+                    <td><strong>${formatarMinutosParaHHMM(totals.normal)}</strong></td>
+                    <td><strong>${formatarMinutosParaHHMM(totals.overtime_50)}</strong></td>
+                    <td><strong>${formatarMinutosParaHHMM(totals.overtime_100)}</strong></td>
+                    <td><strong>${formatarMinutosParaHHMM(totals.undertime)}</strong></td>
+                </tr>
+                <tr>
+                    <td colspan="10" style="text-align:right;"><strong>Resumo de Extras (50% + 100%):</strong></td>
+                    <td colspan="3"><strong>${formatarMinutosParaHHMM(totals.overtime_50 + totals.overtime_100)}</strong></td>
+                </tr>
+                 <tr>
+                    <td colspan="10" style="text-align:right;"><strong>SALDO FINAL (EXTRAS - FALTAS):</strong></td>
+                    <td colspan="3" style="font-size: 1.1em;"><strong>${formatarMinutosParaHHMM(saldoFinal)}</strong></td>
+                </tr>
+            </tfoot>
+        </table>
+        </div></div>`;
+        return reportHTML;
     }
 
     async function saveOverride() {
@@ -305,6 +344,16 @@ document.addEventListener('DOMContentLoaded', () => {
             if (!response.ok) throw new Error(result.detail || 'Erro no servidor');
             uploadMessage.textContent = result.message;
             uploadMessage.className = 'success-message';
+            if (result.error_file) {
+                const errorLink = document.createElement('a');
+                errorLink.href = '#';
+                errorLink.textContent = ' Baixar linhas com erro';
+                errorLink.addEventListener('click', (event) => {
+                    event.preventDefault();
+                    downloadScheduleErrors(result.error_file);
+                });
+                uploadMessage.appendChild(errorLink);
+            }
             scheduleFileInput.value = '';
         } catch (error) {
             uploadMessage.textContent = `Erro: ${error.message}`;
@@ -315,6 +364,21 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function downloadScheduleErrors(url) {
+        try {
+            const response = await fetch(url, { headers: { 'Authorization': `Bearer ${authToken}` } });
+            if (!response.ok) throw new Error('Arquivo de erros não encontrado.');
+            const blobUrl = URL.createObjectURL(await response.blob());
+            const link = document.createElement('a');
+            link.href = blobUrl;
+            link.download = 'erros_escala.csv';
+            link.click();
+            URL.revokeObjectURL(blobUrl);
+        } catch (error) {
+            alert(`Não foi possível baixar o arquivo de erros: ${error.message}`);
+        }
+    }
+
     loginBtn.addEventListener('click', handleLogin);
     generateReportBtn.addEventListener('click', generateReport);
     saveOverrideBtn.addEventListener('click', saveOverride);
@@ -0,0 +1,80 @@
+# test_balance_engine.py
+# Confere balance_engine.py contra as funções por dia de main.py com dados aleatórios (hypothesis).
+# As funções de referência são carregadas de main.py (ver conftest.py) com um conjunto de feriados gerado
+# pelo próprio teste.
+#
+# Uso:
+#   python -m pytest -q test_balance_engine.py
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from hypothesis import given, settings, strategies as st
+
+import balance_engine
+
+REFERENCE_FUNCTIONS = ("_calculate_minutes_from_punches", "calculate_daily_balance")
+DAY_TYPES = [None, "", "S", "N", "D", "C"]
+FIRST_DAY = date(2025, 1, 1)
+
+
+def load_reference_functions(load_from_main, holidays):
+    namespace = load_from_main(REFERENCE_FUNCTIONS, br_holidays=holidays, date=date, datetime=datetime, List=List, Dict=Dict, Optional=Optional)
+    return namespace["_calculate_minutes_from_punches"], namespace["calculate_daily_balance"]
+
+
+# Uma batida: ausente ou minutos desde 00:00 do dia (até o dia seguinte, para turnos noturnos e batidas fora de ordem)
+punch_minutes = st.one_of(st.none(), st.integers(min_value=0, max_value=2 * 24 * 60 - 1))
+day = st.fixed_dictionaries({
+    "punches": st.lists(punch_minutes, min_size=4, max_size=4),
+    "seconds": st.lists(st.integers(min_value=0, max_value=59), min_size=4, max_size=4),
+    "planned": st.integers(min_value=-60, max_value=16 * 60),
+    "day_type": st.sampled_from(DAY_TYPES),
+    "holiday": st.booleans(),
+})
+
+
+@settings(max_examples=300, deadline=None)
+@given(st.lists(day, min_size=1, max_size=62))
+def test_vectorized_engine_matches_per_day_functions(load_from_main, days):
+    work_dates = [FIRST_DAY + timedelta(days=i) for i in range(len(days))]
+    holidays = {work_date for work_date, d in zip(work_dates, days) if d["holiday"]}
+    calculate_minutes, calculate_daily_balance = load_reference_functions(load_from_main, holidays)
+
+    punch_matrix = np.full((len(days), 4), np.datetime64("NaT"), dtype="datetime64[s]")
+    expected_worked, expected_balances = [], []
+    for row, (work_date, d) in enumerate(zip(work_dates, days)):
+        punches = []
+        for slot, (minutes, seconds) in enumerate(zip(d["punches"], d["seconds"])):
+            if minutes is None:
+                continue
+            punch = datetime.combine(work_date, datetime.min.time()) + timedelta(minutes=minutes, seconds=seconds)
+            punches.append(punch)
+            punch_matrix[row, slot] = np.datetime64(punch, "s")
+        worked = calculate_minutes(punches)
+        expected_worked.append(worked)
+        expected_balances.append(calculate_daily_balance(work_date, worked, d["planned"], d["day_type"]))
+
+    worked = balance_engine.calculate_worked_minutes(punch_matrix)
+    assert worked.tolist() == expected_worked
+
+    balances = balance_engine.calculate_balances(
+        worked, [d["planned"] for d in days], [d["day_type"] for d in days], [d["holiday"] for d in days]
+    )
+    for row, expected in enumerate(expected_balances):
+        assert {key: int(balances[key][row]) for key in balance_engine.BALANCE_KEYS} == expected
+
+    expected_totals = {key: sum(expected[key] for expected in expected_balances) for key in balance_engine.BALANCE_KEYS}
+    assert balance_engine.calculate_totals(balances) == expected_totals
+
+
+@settings(max_examples=100, deadline=None)
+@given(st.lists(st.tuples(st.integers(min_value=0, max_value=4), st.integers(min_value=-500, max_value=500)), min_size=1, max_size=200))
+def test_grouped_totals_match_per_group_sums(rows):
+    group_index = [group for group, _ in rows]
+    values = np.asarray([value for _, value in rows], dtype=np.int64)
+    balances = {key: values for key in balance_engine.BALANCE_KEYS}
+    totals = balance_engine.calculate_totals(balances, group_index, group_count=5)
+    for group in range(5):
+        expected = sum(value for g, value in rows if g == group)
+        assert all(int(totals[key][group]) == expected for key in balance_engine.BALANCE_KEYS)
@@ -0,0 +1,135 @@
+# test_daily_balances.py
+# Gravação e descarte dos saldos diários materializados de main.py, com SQLite no lugar do PostgreSQL.
+# O turno padrão, a escala e as batidas dos funcionários, que viriam do Protheus, são informados pelo próprio teste.
+import calendar
+import logging
+import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import create_engine, event, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+
+import main_system_queries
+import models
+
+CYCLE_START = date(2025, 1, 1)
+
+
+@pytest.fixture
+def db_app():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_balance(db_app, employee_id, work_date):
+    db_app.add(models.DailyBalance(employee_id=employee_id, work_date=work_date, cycle_start_date=CYCLE_START))
+
+
+def remaining(db_app):
+    return sorted((b.employee_id, b.work_date.day) for b in db_app.query(models.DailyBalance).all())
+
+
+def load_invalidation(load_from_main, employees_by_shift):
+    protheus = SimpleNamespace(get_employee_ids_by_shift=lambda db, code: employees_by_shift.get(code, []))
+    namespace = load_from_main(("_invalidate_shift_daily_balances",), models=models, main_system_queries=protheus,
+                               Session=Session, Optional=Optional, or_=or_)
+    return namespace["_invalidate_shift_daily_balances"]
+
+
+@pytest.fixture
+def balances(db_app):
+    for employee_id in ("0601000001", "0601000002", "0601000003"):
+        for day in (1, 2):
+            add_balance(db_app, employee_id, date(2025, 3, day))
+    # O funcionário 3 tem turno padrão 002, mas a escala do app usa o turno 001 no dia 2
+    db_app.add(models.EscalaDiaria(employee_id="0601000003", work_date=date(2025, 3, 2), day_type="TRABALHO", shift_code="001"))
+    db_app.commit()
+    return db_app
+
+
+def test_shift_invalidation_removes_default_and_scheduled_days(load_from_main, balances):
+    invalidate = load_invalidation(load_from_main, {"001": ["0601000001"], "002": ["0601000002", "0601000003"]})
+    assert invalidate(balances, None, " 001 ") == 3
+    balances.commit()
+    assert remaining(balances) == [("0601000002", 1), ("0601000002", 2), ("0601000003", 1)]
+
+
+def test_invalidation_without_shift_removes_everything(load_from_main, balances):
+    invalidate = load_invalidation(load_from_main, {})
+    assert invalidate(balances, None, None) == 6
+    assert remaining(balances) == []
+
+
+def test_save_failure_rolls_back_and_logs(load_from_main, db_app, caplog):
+    namespace = load_from_main(("_save_daily_balances",), models=models, pg_insert=pg_insert, SQLAlchemyError=SQLAlchemyError,
+                               logger=logging.getLogger("main"), Session=Session, List=List, Dict=Dict, Any=Any)
+    add_balance(db_app, "0601000001", date(2025, 3, 1))
+    db_app.flush()
+    # Sem cycle_start_date (NOT NULL) a gravação falha
+    with caplog.at_level(logging.ERROR, logger="main"):
+        namespace["_save_daily_balances"](db_app, [{"employee_id": "0601000002", "work_date": date(2025, 3, 1)}])
+    assert "saldo(s) diário(s)" in caplog.text
+    assert remaining(db_app) == []
+
+
+REPORT_DEFINITIONS = (
+    "_iter_monthly_report", "_build_monthly_report", "_save_daily_balances", "_load_records_by_employee_day",
+    "_combine_punches", "_calculate_minutes_from_punches", "calculate_daily_balance", "PunchTimeline",
+    "CalculatedMinutes", "DailyBreakdown", "DetailedReportData", "MonthlyReportRequest", "DAILY_BALANCE_SETTLE_DAYS",
+)
+
+
+def fake_protheus(punches_by_employee):
+    """Turno 001 (segunda a sexta, 08:00-12:00 e 13:00-17:00) para todos; batidas informadas pelo teste."""
+    rows = [
+        SimpleNamespace(turno="001", semana="01", dia=str(dia), filial="", PJ_TPDIA="S" if 2 <= dia <= 6 else "D",
+                        horas_trabalhadas=8.0 if 2 <= dia <= 6 else 0.0, PJ_ENTRA1=8.0 if 2 <= dia <= 6 else 0.0,
+                        PJ_SAIDA1=12.0 if 2 <= dia <= 6 else 0.0, PJ_ENTRA2=13.0 if 2 <= dia <= 6 else 0.0,
+                        PJ_SAIDA2=17.0 if 2 <= dia <= 6 else 0.0)
+        for dia in range(1, 8)
+    ]
+    return SimpleNamespace(
+        get_employee_shift_code=lambda db, employee_id: "001",
+        load_shift_calendar=lambda db, codes: main_system_queries.ShiftCalendar(rows, {"001": "Comercial"}),
+        get_raw_punches_for_employees=lambda db, employee_ids, start, end: {
+            employee_id: punches_by_employee.get(employee_id, []) for employee_id in employee_ids
+        },
+    )
+
+
+def test_monthly_report_completes_when_balance_write_fails(load_from_main, db_app, caplog):
+    # Um mês já fechado: todos os dias seriam materializados. A gravação dos saldos falha, e o relatório
+    # precisa sair completo mesmo assim.
+    def fail_balance_insert(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO DAILY_BALANCES"):
+            raise OperationalError(statement, parameters, Exception("disco cheio"))
+    event.listen(db_app.get_bind(), "before_cursor_execute", fail_balance_insert)
+
+    punches = [datetime(2025, 3, 3, h, m) for h, m in ((8, 0), (12, 0), (13, 0), (17, 30))]
+    namespace = load_from_main(
+        REPORT_DEFINITIONS, models=models, main_system_queries=fake_protheus({"0601000001": punches}),
+        pg_insert=pg_insert, SQLAlchemyError=SQLAlchemyError, logger=logging.getLogger("main"), br_holidays=set(),
+        os=os, calendar=calendar, defaultdict=defaultdict, bisect_left=bisect_left, bisect_right=bisect_right,
+        BaseModel=BaseModel, Session=Session, date=date, datetime=datetime, time=time, timedelta=timedelta,
+        List=List, Dict=Dict, Any=Any, Optional=Optional,
+    )
+    request = namespace["MonthlyReportRequest"](employee_ids=["0601000001", "0601000002"], year=2025, month=3, cycle_start_date=CYCLE_START)
+    with caplog.at_level(logging.ERROR, logger="main"):
+        report = namespace["_build_monthly_report"](request, request.employee_ids, {"0601000001": "Ana"}, db_app, None)
+
+    assert [r.employee_id for r in report] == ["0601000001", "0601000002"]
+    assert all(len(r.daily_breakdown) == 31 for r in report)
+    assert report[0].daily_breakdown[2].calculated_minutes.overtime_50 == 30
+    assert "saldo(s) diário(s)" in caplog.text
+    assert remaining(db_app) == []
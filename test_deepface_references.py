@@ -0,0 +1,44 @@
+# test_deepface_references.py
+# Limpeza das referências do DeepFace (deepface_references.py) quando fotos saem de fotos_referencia/.
+# Não usa o DeepFace: só a manutenção dos arquivos da pasta do modelo.
+import json
+import os
+
+import numpy as np
+
+import deepface_references
+from face_store import FaceEmbeddingStore, save_encoding
+
+
+def test_orphan_references_are_removed(tmp_path):
+    directory = str(tmp_path)
+    for employee_id in ("0001", "0002", "0003"):
+        save_encoding(directory, employee_id, np.ones(4, dtype=np.float32))
+    hashes = {"0001": "a", "0002": "b", "0004": "d"}
+
+    removed = deepface_references._remove_orphans(directory, hashes, {"0001"})
+
+    assert removed == ["0002", "0003", "0004"]
+    assert hashes == {"0001": "a"}
+    assert sorted(os.listdir(directory)) == ["0001.npy"]
+
+
+def test_index_drops_removed_references(tmp_path):
+    directory = str(tmp_path)
+    for employee_id in ("0001", "0002"):
+        save_encoding(directory, employee_id, np.ones(4, dtype=np.float32))
+    store = FaceEmbeddingStore(directory, metric="cosine")
+    store.rebuild()
+    deepface_references._remove_orphans(directory, {}, {"0001"})
+    store.refresh_if_changed()
+    assert store.get_encoding("0002") is None
+    assert len(store) == 1
+
+
+def test_hashes_are_replaced_atomically(tmp_path):
+    hashes_path = str(tmp_path / deepface_references.HASHES_FILENAME)
+    deepface_references._save_hashes(hashes_path, {"0001": "a"})
+    deepface_references._save_hashes(hashes_path, {"0002": "b"})
+    with open(hashes_path, encoding="utf-8") as hashes_file:
+        assert json.load(hashes_file) == {"0002": "b"}
+    assert os.listdir(tmp_path) == [deepface_references.HASHES_FILENAME]
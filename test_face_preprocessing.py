@@ -0,0 +1,79 @@
+# test_face_preprocessing.py
+# Preparação das fotos (face_preprocessing.prepare_image): redução opcional, orientação EXIF e fotos ilegíveis.
+# Só usa o Pillow; a detecção e o encoding (face_recognition/dlib) são medidos em benchmark_face_preprocessing.py.
+import glob
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+import face_preprocessing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXIF_ORIENTATION = 0x0112
+
+
+def jpeg_bytes(image, orientation=None):
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def two_color_image(width, height):
+    """Metade esquerda vermelha, metade direita azul."""
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :width // 2] = (255, 0, 0)
+    pixels[:, width // 2:] = (0, 0, 255)
+    return Image.fromarray(pixels)
+
+
+def test_reduction_is_off_by_default(monkeypatch):
+    monkeypatch.setattr(face_preprocessing, "FACE_PREPROCESS_MAX_SIDE", None)
+    for model_name in ("face_recognition", "VGG-Face", "outro"):
+        assert face_preprocessing.get_settings(model_name)["max_side"] == 0
+    image = face_preprocessing.prepare_image(jpeg_bytes(two_color_image(4000, 3000)), "face_recognition")
+    assert image.shape == (3000, 4000, 3)
+
+
+def test_large_photo_is_reduced_keeping_aspect_ratio(monkeypatch):
+    monkeypatch.setattr(face_preprocessing, "FACE_PREPROCESS_MAX_SIDE", "800")
+    image = face_preprocessing.prepare_image(jpeg_bytes(two_color_image(4000, 3000)), "face_recognition")
+    assert image.dtype == np.uint8 and image.shape[2] == 3
+    assert max(image.shape[:2]) == 800
+    assert abs(image.shape[1] / image.shape[0] - 4 / 3) < 0.01
+
+
+def test_small_photo_keeps_its_size(monkeypatch):
+    monkeypatch.setattr(face_preprocessing, "FACE_PREPROCESS_MAX_SIDE", "800")
+    image = face_preprocessing.prepare_image(jpeg_bytes(two_color_image(320, 240)), "face_recognition")
+    assert image.shape == (240, 320, 3)
+
+
+def test_exif_orientation_is_applied():
+    # Orientação 6: a foto é exibida girada 90° no sentido horário, então a metade esquerda fica em cima
+    image = face_preprocessing.prepare_image(jpeg_bytes(two_color_image(400, 200), orientation=6), "face_recognition")
+    assert image.shape == (400, 200, 3)
+    top, bottom = image[:150].mean(axis=(0, 1)), image[-150:].mean(axis=(0, 1))
+    assert top[0] > 200 and top[2] < 60
+    assert bottom[2] > 200 and bottom[0] < 60
+
+
+def test_unreadable_photo_returns_none():
+    assert face_preprocessing.prepare_image(b"isto nao e uma imagem", "face_recognition") is None
+    assert face_preprocessing.prepare_image(jpeg_bytes(two_color_image(64, 64))[:200], "face_recognition") is None
+
+
+def test_reference_photos_fit_the_configured_limit(monkeypatch):
+    monkeypatch.setattr(face_preprocessing, "FACE_PREPROCESS_MAX_SIDE", "800")
+    photos = sorted(glob.glob(os.path.join(BASE_DIR, "fotos_referencia", "*.jpg")))
+    for model_name in ("face_recognition", "VGG-Face"):
+        max_side = face_preprocessing.get_settings(model_name)["max_side"]
+        for path in photos:
+            with open(path, "rb") as photo:
+                image = face_preprocessing.prepare_image(photo.read(), model_name)
+            assert image is not None, path
+            assert max(image.shape[:2]) <= max_side, path
@@ -0,0 +1,52 @@
+# test_face_store.py
+# Atualização do índice de face_store.py quando os encodings mudam: arquivos novos, removidos e regravados no lugar.
+#
+# Uso:
+#   python -m pytest -q test_face_store.py
+import os
+
+import numpy as np
+
+from face_store import FaceEmbeddingStore, save_encoding
+
+
+def _encoding(seed):
+    return np.random.default_rng(seed).random(128, dtype=np.float32)
+
+
+def test_picks_up_added_and_removed_encodings(tmp_path):
+    save_encoding(str(tmp_path), "0001", _encoding(1))
+    store = FaceEmbeddingStore(str(tmp_path), scan_interval_seconds=0)
+    store.refresh_if_changed()
+    assert len(store) == 1
+
+    save_encoding(str(tmp_path), "0002", _encoding(2))
+    store.refresh_if_changed()
+    assert len(store) == 2
+
+    os.remove(tmp_path / "0001.npy")
+    store.refresh_if_changed()
+    assert store.get_encoding("0001") is None
+    assert len(store) == 1
+
+
+def test_picks_up_encoding_overwritten_in_place(tmp_path):
+    # np.save direto sobre o arquivo (sem os.replace) não muda o mtime da pasta; a verificação por arquivo percebe
+    np.save(tmp_path / "0001.npy", _encoding(1))
+    store = FaceEmbeddingStore(str(tmp_path), scan_interval_seconds=0)
+    store.refresh_if_changed()
+    directory_mtime = os.stat(tmp_path).st_mtime_ns
+
+    replacement = _encoding(2)
+    np.save(tmp_path / "0001.npy", replacement)
+    os.utime(tmp_path / "0001.npy", ns=(directory_mtime + 1, directory_mtime + 1))
+    os.utime(tmp_path, ns=(directory_mtime, directory_mtime))
+    store.refresh_if_changed()
+    np.testing.assert_array_equal(store.get_encoding("0001"), replacement)
+
+
+def test_save_encoding_replaces_file_without_leftovers(tmp_path):
+    save_encoding(str(tmp_path), "0001", _encoding(1))
+    path = save_encoding(str(tmp_path), "0001", _encoding(2))
+    np.testing.assert_array_equal(np.load(path), _encoding(2))
+    assert sorted(os.listdir(tmp_path)) == ["0001.npy"]
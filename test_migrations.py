@@ -0,0 +1,27 @@
+# test_migrations.py
+# Conferência do esquema feita pela API na inicialização (migrations.check_schema), com SQLite.
+import pytest
+from sqlalchemy import create_engine, text
+
+import migrations
+import models
+
+
+def test_schema_created_by_models_is_up_to_date():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    assert migrations.missing_columns(engine) == []
+    migrations.check_schema(engine)
+
+
+def test_old_table_without_new_column_stops_startup():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE app_users (id INTEGER PRIMARY KEY, username VARCHAR, hashed_password VARCHAR)"))
+    assert migrations.missing_columns(engine) == ["app_users.token_version"]
+    with pytest.raises(RuntimeError, match="python migrations.py"):
+        migrations.check_schema(engine)
+
+
+def test_missing_table_is_left_to_create_all():
+    assert migrations.missing_columns(create_engine("sqlite://")) == []
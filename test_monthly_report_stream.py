@@ -0,0 +1,52 @@
+# test_monthly_report_stream.py
+# Última linha do relatório mensal em NDJSON (/report/monthly/stream): confirmação do fim ou erro no meio do envio.
+# O endpoint é carregado de main.py (ver conftest.py) com os lotes de funcionários fornecidos pelo teste.
+import json
+import logging
+from types import SimpleNamespace
+
+from pydantic import BaseModel
+
+import models
+
+
+class Report(BaseModel):
+    employee_id: str
+
+
+def load_stream_endpoint(load_from_main, chunks):
+    def iter_chunks(request, employee_names, chunk_size):
+        for chunk in chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield [Report(employee_id=employee_id) for employee_id in chunk]
+
+    routes = SimpleNamespace(post=lambda path, **kwargs: (lambda endpoint: endpoint))
+    namespace = load_from_main(
+        ("stream_detailed_monthly_report",), app=routes, json=json, logger=logging.getLogger("main"), models=models,
+        MonthlyReportRequest=object, Session=object, Depends=lambda dependency: None, get_db_main=None, get_current_user=None,
+        REPORT_STREAM_CHUNK_SIZE=2, _get_employee_names=lambda db_main: {}, _iter_monthly_report_chunks=iter_chunks,
+        StreamingResponse=lambda content, media_type: content,
+    )
+    return namespace["stream_detailed_monthly_report"]
+
+
+def stream_lines(endpoint):
+    return [json.loads(line) for line in endpoint(request=None, db_main=None, current_user=None)]
+
+
+def test_stream_ends_with_completion_marker(load_from_main):
+    lines = stream_lines(load_stream_endpoint(load_from_main, [["0001", "0002"], ["0003"]]))
+    assert [line.get("employee_id") for line in lines[:-1]] == ["0001", "0002", "0003"]
+    assert lines[-1] == {"done": True, "employees": 3}
+
+
+def test_error_after_streaming_started_is_sent_as_last_line(load_from_main, caplog):
+    endpoint = load_stream_endpoint(load_from_main, [["0001", "0002"], RuntimeError("Protheus indisponível")])
+    with caplog.at_level(logging.ERROR, logger="main"):
+        lines = stream_lines(endpoint)
+    assert [line.get("employee_id") for line in lines[:-1]] == ["0001", "0002"]
+    assert "Protheus indisponível" in lines[-1]["error"]
+    assert lines[-1]["employees"] == 2
+    assert not any(line.get("done") for line in lines)
+    assert "após 2 funcionário(s)" in caplog.text
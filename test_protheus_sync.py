@@ -0,0 +1,146 @@
+# test_protheus_sync.py
+# Sincronização incremental do espelho de batidas, com SQLite no lugar do SQL Server do Protheus e do
+# PostgreSQL da aplicação.
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+import protheus_sync
+
+TODAY = date.today()
+DAY = TODAY - timedelta(days=3)
+
+
+def protheus_date(day):
+    return day.strftime('%Y%m%d')
+
+
+@pytest.fixture
+def databases():
+    engine_main = create_engine("sqlite://")
+    with engine_main.begin() as connection:
+        for table, prefix in (("SP8010", "P8"), ("SPG010", "PG")):
+            connection.execute(text(f"""
+                CREATE TABLE {table} (
+                    R_E_C_N_O_ INTEGER PRIMARY KEY, {prefix}_FILIAL TEXT, {prefix}_MAT TEXT,
+                    {prefix}_DATA TEXT, {prefix}_HORA REAL, D_E_L_E_T_ TEXT
+                )
+            """))
+    engine_app = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine_app)
+    db_main = sessionmaker(bind=engine_main)()
+    db_app = sessionmaker(bind=engine_app)()
+    yield db_main, db_app
+    db_main.close()
+    db_app.close()
+
+
+def add_punch(db_main, table, recno, matricula, day, hora, deleted=" "):
+    prefix = "P8" if table == "SP8010" else "PG"
+    db_main.execute(text(f"""
+        INSERT INTO {table} (R_E_C_N_O_, {prefix}_FILIAL, {prefix}_MAT, {prefix}_DATA, {prefix}_HORA, D_E_L_E_T_)
+        VALUES (:recno, '06', :matricula, :data, :hora, :deleted)
+    """), {"recno": recno, "matricula": matricula, "data": protheus_date(day), "hora": hora, "deleted": deleted})
+    db_main.commit()
+
+
+def add_daily_balance(db_app, employee_id, work_date):
+    db_app.add(models.DailyBalance(employee_id=employee_id, work_date=work_date, cycle_start_date=date(2025, 1, 1)))
+    db_app.commit()
+
+
+def mirrored(db_app):
+    return {
+        (p.source_table, p.recno): (p.employee_id, p.punch_datetime, p.deleted)
+        for p in db_app.query(models.ProtheusPunch).all()
+    }
+
+
+def test_initial_load_and_idempotent_rerun(databases):
+    db_main, db_app = databases
+    add_punch(db_main, "SP8010", 1, "01000343", DAY, 8.00)
+    add_punch(db_main, "SP8010", 2, "01000343", DAY, 12.30)
+    add_punch(db_main, "SP8010", 3, "01000343", DAY, 13.30, deleted="*")
+    add_punch(db_main, "SPG010", 10, "01000001", DAY, 22.40)
+
+    summary = protheus_sync.sync_protheus_punches(db_main, db_app)
+    assert summary["SP8010"] == 3 and summary["SPG010"] == 1
+    assert mirrored(db_app)[("SP8010", 2)] == ("0601000343", datetime.combine(DAY, time(12, 30)), False)
+    assert mirrored(db_app)[("SP8010", 3)][2] is True
+    assert db_app.get(models.ProtheusSyncState, "SP8010").last_recno == 3
+
+    summary = protheus_sync.sync_protheus_punches(db_main, db_app)
+    assert summary == {"invalidated_daily_balances": 0, "SP8010": 0, "SPG010": 0}
+    punches = protheus_sync.get_mirrored_punches_for_employees(db_app, ["0601000343"], DAY, DAY)
+    assert punches["0601000343"] == [datetime.combine(DAY, time(8, 0)), datetime.combine(DAY, time(12, 30))]
+
+
+def test_changed_rows_invalidate_daily_balances(databases):
+    db_main, db_app = databases
+    add_punch(db_main, "SP8010", 1, "01000343", DAY, 8.00)
+    protheus_sync.sync_protheus_punches(db_main, db_app)
+    for work_date in (DAY - timedelta(days=2), DAY - timedelta(days=1), DAY):
+        add_daily_balance(db_app, "0601000343", work_date)
+
+    # Correção no Protheus: mesma linha (mesmo R_E_C_N_O_), novo horário
+    db_main.execute(text("UPDATE SP8010 SET P8_HORA = 7.55 WHERE R_E_C_N_O_ = 1"))
+    db_main.commit()
+    summary = protheus_sync.sync_protheus_punches(db_main, db_app)
+
+    assert summary["SP8010"] == 1 and summary["invalidated_daily_balances"] == 2
+    assert mirrored(db_app)[("SP8010", 1)][1] == datetime.combine(DAY, time(7, 55))
+    remaining = [b.work_date for b in db_app.query(models.DailyBalance).all()]
+    assert remaining == [DAY - timedelta(days=2)]
+
+
+def test_failure_keeps_punches_watermark_and_balances_consistent(databases, monkeypatch):
+    db_main, db_app = databases
+    add_punch(db_main, "SP8010", 1, "01000343", DAY, 8.00)
+    add_daily_balance(db_app, "0601000343", DAY)
+
+    def failing_invalidation(db, changed_days):
+        raise RuntimeError("queda no meio da sincronização")
+
+    monkeypatch.setattr(protheus_sync, "_invalidate_changed_days", failing_invalidation)
+    with pytest.raises(RuntimeError):
+        protheus_sync.sync_protheus_punches(db_main, db_app)
+    # Nada da faixa foi gravado: nem batidas, nem marca d'água
+    assert mirrored(db_app) == {}
+    assert db_app.get(models.ProtheusSyncState, "SP8010") is None
+    monkeypatch.undo()
+
+    summary = protheus_sync.sync_protheus_punches(db_main, db_app)
+    assert summary["SP8010"] == 1 and summary["invalidated_daily_balances"] == 1
+    assert db_app.query(models.DailyBalance).count() == 0
+
+
+def test_lookback_pass_reads_in_recno_pages(databases, monkeypatch):
+    db_main, db_app = databases
+    old_day = TODAY - timedelta(days=protheus_sync.SYNC_LOOKBACK_DAYS + 10)
+    for recno in range(1, 4):
+        add_punch(db_main, "SP8010", recno, "01000343", old_day, 8.00)
+    for recno in range(4, 11):
+        add_punch(db_main, "SP8010", recno, "01000343", DAY, 8.00 + recno / 100)
+    protheus_sync.sync_protheus_punches(db_main, db_app)
+
+    db_main.execute(text("UPDATE SP8010 SET P8_HORA = 6.00 WHERE R_E_C_N_O_ IN (4, 10)"))
+    db_main.commit()
+    batches = []
+    apply_batch = protheus_sync._apply_batch
+
+    def recording_apply_batch(db, table_name, source_rows):
+        if table_name == "SP8010":
+            batches.append(sorted(row.recno for row in source_rows))
+        return apply_batch(db, table_name, source_rows)
+
+    monkeypatch.setattr(protheus_sync, "SYNC_BATCH_SIZE", 3)
+    monkeypatch.setattr(protheus_sync, "_apply_batch", recording_apply_batch)
+    summary = protheus_sync.sync_protheus_punches(db_main, db_app)
+
+    # Começa na primeira linha do período (R_E_C_N_O_ 4), em faixas de no máximo 3
+    assert batches == [[4, 5, 6], [7, 8, 9], [10]]
+    assert summary["SP8010"] == 2
+    assert mirrored(db_app)[("SP8010", 10)][1] == datetime.combine(DAY, time(6, 0))
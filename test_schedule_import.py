@@ -0,0 +1,97 @@
+# test_schedule_import.py
+# Validação e normalização vetorizadas da planilha de escala (_read_schedule_chunks/_normalize_schedule_chunk)
+# e andamento do trabalho de importação em segundo plano.
+import io
+import os
+from datetime import date
+from types import SimpleNamespace
+from typing import Optional, Callable
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SCHEDULE_DEFINITIONS = ("SCHEDULE_COLUMNS", "SCHEDULE_IMPORT_CHUNK_SIZE", "_read_schedule_chunks", "_normalize_schedule_chunk")
+
+
+@pytest.fixture(scope="module")
+def schedule(load_from_main):
+    return load_from_main(SCHEDULE_DEFINITIONS, os=os, pd=pd, np=np, Optional=Optional, Callable=Callable)
+
+
+def normalize_csv(schedule, content):
+    chunks = list(schedule["_read_schedule_chunks"]("escala.csv", io.StringIO(content)))
+    return [schedule["_normalize_schedule_chunk"](chunk) for chunk in chunks]
+
+
+def test_all_folga_file_has_null_shift_codes(schedule):
+    content = "employee_id,work_date,day_type,shift_code\n" + "".join(
+        f"601000343,2025-01-{day:02d},FOLGA,\n" for day in range(1, 8)
+    )
+    [(valid, errors)] = normalize_csv(schedule, content)
+    assert len(valid) == 7 and errors.empty
+    assert valid["shift_code"].isna().all()
+    assert valid["employee_id"].tolist() == ["0601000343"] * 7
+    assert valid["work_date"].tolist() == [date(2025, 1, day) for day in range(1, 8)]
+
+
+def test_mixed_file_normalizes_and_rejects_rows(schedule):
+    content = (
+        "employee_id,work_date,day_type,shift_code\n"
+        "601000343,2025-01-01,TRABALHO,1.0\n"
+        "601000343,02/01/2025,folga,\n"
+        ",2025-01-03,TRABALHO,002\n"
+        "601000343,não é data,TRABALHO,002\n"
+        "601000343,2025-01-05,FERIAS,\n"
+    )
+    [(valid, errors)] = normalize_csv(schedule, content)
+    assert valid["linha"].tolist() == [2, 3]
+    assert valid["shift_code"].tolist()[0] == "001" and pd.isna(valid["shift_code"].tolist()[1])
+    assert valid["day_type"].tolist() == ["TRABALHO", "FOLGA"]
+    assert errors["linha"].tolist() == [4, 5, 6]
+    assert errors["motivo"].tolist() == ["employee_id vazio", "work_date inválida", "day_type deve ser TRABALHO ou FOLGA"]
+
+
+def test_import_job_reports_progress_by_file_position(load_from_main, tmp_path):
+    path = tmp_path / "escala.csv"
+    path.write_text("employee_id,work_date,day_type,shift_code\n" + "601000343,2025-01-01,FOLGA,\n" * 4)
+
+    def fake_import(db, filename, fileobj, on_chunk=None):
+        fileobj.readline()
+        for rows in range(1, 5):
+            fileobj.readline()
+            on_chunk(rows)
+        return {"status": "success"}
+
+    namespace = load_from_main(
+        ("_run_schedule_import_job",), os=os, Dict=dict, Any=object, Callable=Callable, Session=object,
+        models=SimpleNamespace(BackgroundJob=object), _import_schedule_file=fake_import
+    )
+    calls = []
+    result = namespace["_run_schedule_import_job"](None, {"path": str(path), "filename": "escala.csv"}, None, lambda *args: calls.append(args))
+    assert result == {"status": "success"} and not path.exists()
+    percents = [percent for percent, _ in calls]
+    assert percents == sorted(percents) and 0 < percents[0] < percents[-1] == 99
+    assert calls[-1][1] == "4 linha(s) lidas."
+
+
+def test_job_progress_refreshes_stale_detection_timestamp():
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    import jobs
+    import models
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    old = datetime.now() - timedelta(minutes=jobs.JOB_STALE_MINUTES + 5)
+    with Session(bind=engine) as db:
+        job = models.BackgroundJob(id="abc", job_type="schedule_import", status="running", progress=0, created_at=old, updated_at=old)
+        db.add(job)
+        db.commit()
+        jobs.JobProgress(db, job)(40, "10 linha(s) lidas.")
+        db.refresh(job)
+        assert job.progress == 40 and job.message == "10 linha(s) lidas."
+        assert job.updated_at > datetime.now() - timedelta(minutes=1)
@@ -1,22 +1,23 @@
 # teste_deepface.py
-from deepface import DeepFace
-import cv2 # DeepFace usa OpenCV por baixo, então é bom ter
+import os
+
+import deepface_references
 
 print("--- Testando a biblioteca DeepFace ---")
 
-# Caminho para as duas imagens que vamos comparar
-foto_referencia_path = r"fotos_referencia\0601000343.jpg"
-foto_batida_path = r"fotos_batidas\teste.jpg" # Use aqui o nome da foto que você salvou para o teste
+# A foto de referência não é mais processada a cada teste: o embedding dela fica guardado em
+# encodings/deepface/<modelo>/ (ver deepface_references.py) e só a foto da batida passa pelo modelo.
+matricula = "0601000343"
+foto_batida_path = os.path.join("fotos_batidas", "teste.jpg") # Use aqui o nome da foto que você salvou para o teste
+# model_name='VGG-Face' é um dos modelos mais populares e confiáveis.
+model_name = 'VGG-Face'
 
 try:
-    # Esta é a função principal da DeepFace.
-    # Ela faz tudo: encontra o rosto, gera a "digital" e compara.
-    # model_name='VGG-Face' é um dos modelos mais populares e confiáveis.
-    resultado = DeepFace.verify(
-        img1_path = foto_referencia_path,
-        img2_path = foto_batida_path,
-        model_name = 'VGG-Face'
-    )
+    resumo = deepface_references.build_references(model_name)
+    print(f"Referências de {model_name}: {resumo['built']} geradas, {resumo['skipped']} já existentes.")
+
+    with open(foto_batida_path, "rb") as foto:
+        resultado = deepface_references.verify(matricula, foto.read(), model_name)
 
     print("\n--- Análise Concluída ---")
     print(f"As fotos são da mesma pessoa? {'Sim' if resultado['verified'] else 'Não'}")
@@ -25,4 +26,4 @@ try:
 
 except Exception as e:
     print(f"\n!!!!!!!! OCORREU UM ERRO !!!!!!!!")
-    print(f"Erro: {e}")
\ No newline at end of file
+    print(f"Erro: {e}")